@@ -1,153 +1,240 @@
+import functools
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, and_, case, select, true, update, or_, literal_column
+from sqlalchemy.orm import joinedload
 
-from models import db, User, Mission, MissionCompletion, Membership, MembershipTier, Payment, Withdrawal, Referral
+from models import db, User, Mission, MissionCompletion, Membership, MembershipTier, Payment, Withdrawal, Referral, invalidate_tier_cache
+from app import cache
+from timeutils import day_range
+from pagination import keyset_paginate
+from streaming import stream_json_list
+from user.routes import TIERS_CACHE_KEY
 
 admin_bp = Blueprint('admin', __name__)
 
+# Cache key for the dashboard statistics response
+DASHBOARD_CACHE_KEY = 'admin_dashboard_v1'
+
+# How long an admin's active status is trusted before the users row is re-read
+ADMIN_STATUS_TIMEOUT = 60
+
+# Columns admins may change through the update endpoints
+USER_EDITABLE_FIELDS = ('is_active', 'is_admin', 'email_verified', 'phone_verified')
+MISSION_EDITABLE_FIELDS = ('title', 'description', 'instructions', 'reward', 'type', 'content_url', 'duration', 'is_active')
+TIER_EDITABLE_FIELDS = ('name', 'price', 'daily_missions', 'referral_levels', 'description', 'is_active')
+
+def update_row(model, row_id, data, fields):
+    """Apply the whitelisted fields in data to one row with a single UPDATE.
+
+    Returns the row id, or None if no such row exists. No ORM object is
+    loaded; when data has no editable fields only an id lookup is run.
+    """
+    patch = {field: data[field] for field in fields if field in data}
+    if not patch:
+        return db.session.query(model.id).filter(model.id == row_id).scalar()
+    
+    return db.session.execute(
+        update(model).where(model.id == row_id).values(**patch).returning(model.id)
+    ).scalar()
+
+def admin_status_key(user_id):
+    """Cache key for whether a user is still an active admin"""
+    return f'admin_status_{user_id}'
+
+def is_active_admin(user_id):
+    """Whether the user is currently an active admin.
+
+    Cached for ADMIN_STATUS_TIMEOUT seconds and dropped by update_user, so a
+    demoted or disabled admin is refused on their next request even while
+    their access token is still valid.
+    """
+    key = admin_status_key(user_id)
+    status = cache.get(key)
+    if status is None:
+        status = db.session.query(User.id)\
+            .filter(User.id == user_id, User.is_admin == True, User.is_active == True)\
+            .scalar() is not None
+        cache.set(key, status, timeout=ADMIN_STATUS_TIMEOUT)
+    return status
+
 # Admin authentication middleware
 def admin_required(fn):
     @jwt_required()
+    @functools.wraps(fn)
     def wrapper(*args, **kwargs):
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user or not user.is_admin:
+        # The 'adm' claim (see auth.routes) turns away non-admins without a
+        # lookup; admins are re-checked against the cached status
+        if not get_jwt().get('adm') or not is_active_admin(get_jwt_identity()):
             return jsonify({'error': 'Admin access required'}), 403
         
         return fn(*args, **kwargs)
     
-    # Preserve the original function's name and docstring
-    wrapper.__name__ = fn.__name__
-    wrapper.__doc__ = fn.__doc__
-    
     return wrapper
 
 # Dashboard statistics
 @admin_bp.route('/dashboard', methods=['GET'])
 @admin_required
+@cache.cached(timeout=30, key_prefix=DASHBOARD_CACHE_KEY)
 def dashboard():
-    # Get user statistics
-    total_users = User.query.count()
-    active_memberships = Membership.query.filter_by(is_active=True).count()
-    
-    # Get revenue statistics
-    total_revenue = db.session.query(func.sum(Payment.amount)).filter_by(status='completed').scalar() or 0
-    
-    # Get today's revenue
-    today = datetime.utcnow().date()
-    today_revenue = db.session.query(func.sum(Payment.amount))\
-        .filter(Payment.status == 'completed')\
-        .filter(func.date(Payment.completed_at) == today)\
-        .scalar() or 0
-    
-    # Get mission statistics
-    total_missions = Mission.query.count()
-    active_missions = Mission.query.filter_by(is_active=True).count()
-    completed_missions = MissionCompletion.query.count()
-    
-    # Get today's completed missions
-    today_completed = MissionCompletion.query\
-        .filter(func.date(MissionCompletion.completed_at) == today)\
-        .count()
-    
-    # Get withdrawal statistics
-    pending_withdrawals = Withdrawal.query.filter_by(status='pending').count()
-    total_withdrawn = db.session.query(func.sum(Withdrawal.amount))\
-        .filter_by(status='completed')\
-        .scalar() or 0
+    today_start, tomorrow_start = day_range()
+    week_ago = datetime.utcnow() - timedelta(days=7)
     
-    # Get membership tier distribution
-    tier_distribution = {}
-    for tier in MembershipTier.query.all():
-        count = Membership.query.filter_by(tier_id=tier.id, is_active=True).count()
-        tier_distribution[tier.name] = count
+    # Per-table statistics as conditional aggregates, one row each
+    user_totals = select(
+        func.count(User.id).label('total_users'),
+        func.count(case((User.created_at >= week_ago, User.id))).label('recent_registrations')
+    ).subquery()
+    
+    membership_totals = select(
+        func.count(Membership.id).label('active_memberships')
+    ).where(Membership.is_active == True).subquery()
+    
+    revenue_totals = select(
+        func.coalesce(func.sum(Payment.amount), 0).label('total_revenue'),
+        func.coalesce(func.sum(case((and_(Payment.completed_at >= today_start, Payment.completed_at < tomorrow_start), Payment.amount))), 0).label('today_revenue')
+    ).where(Payment.status == 'completed').subquery()
+    
+    mission_totals = select(
+        func.count(Mission.id).label('total_missions'),
+        func.count(case((Mission.is_active == True, Mission.id))).label('active_missions')
+    ).subquery()
+    
+    completion_totals = select(
+        func.count(MissionCompletion.id).label('completed_missions'),
+        func.count(case((and_(MissionCompletion.completed_at >= today_start, MissionCompletion.completed_at < tomorrow_start), MissionCompletion.id))).label('today_completed')
+    ).subquery()
+    
+    withdrawal_totals = select(
+        func.count(case((Withdrawal.status == 'pending', Withdrawal.id))).label('pending_withdrawals'),
+        func.coalesce(func.sum(case((Withdrawal.status == 'completed', Withdrawal.amount))), 0).label('total_withdrawn')
+    ).subquery()
+    
+    # Fetch all statistics in a single round trip
+    stats = db.session.query(
+            user_totals, membership_totals, revenue_totals,
+            mission_totals, completion_totals, withdrawal_totals
+        )\
+        .select_from(user_totals)\
+        .join(membership_totals, true())\
+        .join(revenue_totals, true())\
+        .join(mission_totals, true())\
+        .join(completion_totals, true())\
+        .join(withdrawal_totals, true())\
+        .one()
     
-    # Get recent registrations (last 7 days)
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    recent_registrations = User.query\
-        .filter(User.created_at >= week_ago)\
-        .count()
+    # Get membership tier distribution
+    tier_counts = db.session.query(MembershipTier.name, func.count(Membership.id))\
+        .outerjoin(Membership, and_(Membership.tier_id == MembershipTier.id, Membership.is_active == True))\
+        .group_by(MembershipTier.name)\
+        .all()
+    tier_distribution = dict(tier_counts)
     
     return jsonify({
         'user_stats': {
-            'total_users': total_users,
-            'active_memberships': active_memberships,
-            'recent_registrations': recent_registrations
+            'total_users': stats.total_users,
+            'active_memberships': stats.active_memberships,
+            'recent_registrations': stats.recent_registrations
         },
         'revenue_stats': {
-            'total_revenue': total_revenue,
-            'today_revenue': today_revenue
+            'total_revenue': stats.total_revenue,
+            'today_revenue': stats.today_revenue
         },
         'mission_stats': {
-            'total_missions': total_missions,
-            'active_missions': active_missions,
-            'completed_missions': completed_missions,
-            'today_completed': today_completed
+            'total_missions': stats.total_missions,
+            'active_missions': stats.active_missions,
+            'completed_missions': stats.completed_missions,
+            'today_completed': stats.today_completed
         },
         'withdrawal_stats': {
-            'pending_withdrawals': pending_withdrawals,
-            'total_withdrawn': total_withdrawn
+            'pending_withdrawals': stats.pending_withdrawals,
+            'total_withdrawn': stats.total_withdrawn
         },
         'membership_distribution': tier_distribution
     }), 200
 
+def user_search_filter(search):
+    """Build the admin user search predicate.
+
+    Substring matches use ILIKE, served by the pg_trgm indexes. On PostgreSQL
+    whole-word matches across all columns also go through the users.search_tsv
+    GIN index, so multi-word searches such as a full name find the user. The
+    column and index are created by migration 8b2e4d6f1a93.
+    """
+    pattern = f'%{search}%'
+    condition = or_(
+        User.username.ilike(pattern),
+        User.email.ilike(pattern),
+        User.phone_number.ilike(pattern),
+        User.first_name.ilike(pattern),
+        User.last_name.ilike(pattern)
+    )
+    
+    if db.engine.dialect.name == 'postgresql':
+        search_tsv = literal_column('users.search_tsv')
+        condition = or_(search_tsv.op('@@')(func.plainto_tsquery('simple', search)), condition)
+    
+    return condition
+
 # User management
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def get_users():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    cursor = request.args.get('cursor')
     search = request.args.get('search', '')
     
-    query = User.query
+    # Select plain rows of the serialized columns instead of hydrating User objects
+    query = db.session.query(
+            User.id, User.username, User.email, User.phone_number, User.first_name, User.last_name,
+            User.is_active, User.is_admin, User.email_verified, User.phone_verified, User.created_at,
+            Membership.id.isnot(None).label('has_membership'),
+            MembershipTier.name.label('membership_tier')
+        )\
+        .outerjoin(Membership, Membership.user_id == User.id)\
+        .outerjoin(MembershipTier, MembershipTier.id == Membership.tier_id)
     
     # Apply search filter if provided
     if search:
-        query = query.filter(
-            (User.username.ilike(f'%{search}%')) |
-            (User.email.ilike(f'%{search}%')) |
-            (User.phone_number.ilike(f'%{search}%')) |
-            (User.first_name.ilike(f'%{search}%')) |
-            (User.last_name.ilike(f'%{search}%'))
-        )
-    
-    users = query.order_by(User.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    result = []
-    for user in users.items:
-        result.append({
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'phone_number': user.phone_number,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'is_active': user.is_active,
-            'is_admin': user.is_admin,
-            'email_verified': user.email_verified,
-            'phone_verified': user.phone_verified,
-            'created_at': user.created_at.isoformat(),
-            'has_membership': user.membership is not None,
-            'membership_tier': user.membership.tier.name if user.membership else None
-        })
-    
-    return jsonify({
-        'users': result,
-        'total': users.total,
-        'pages': users.pages,
-        'current_page': page
-    }), 200
+        query = query.filter(user_search_filter(search))
+    
+    # Seek past the cursor when one is given, otherwise fall back to page numbers
+    if cursor is not None:
+        try:
+            users, next_cursor = keyset_paginate(query, User.created_at, User.id, cursor, per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        users_page = query.order_by(User.created_at.desc())\
+            .paginate(page=page, per_page=per_page, error_out=False)
+        users = users_page.items
+        pagination = {'total': users_page.total, 'pages': users_page.pages, 'current_page': page}
+    
+    return stream_json_list('users', users, **pagination), 200
 
 @admin_bp.route('/users/<int:user_id>', methods=['GET'])
 @admin_required
 def get_user(user_id):
-    user = User.query.get(user_id)
-    if not user:
+    # Load the user with wallet, membership, tier and mission totals in one round trip
+    completion_totals = select(
+        func.count(MissionCompletion.id).label('total_completed'),
+        func.coalesce(func.sum(MissionCompletion.reward), 0).label('total_earned')
+    ).where(MissionCompletion.user_id == user_id).subquery()
+    
+    row = db.session.query(User, completion_totals.c.total_completed, completion_totals.c.total_earned)\
+        .join(completion_totals, true())\
+        .options(
+            joinedload(User.wallet),
+            joinedload(User.membership).joinedload(Membership.tier)
+        )\
+        .filter(User.id == user_id)\
+        .first()
+    if not row:
         return jsonify({'error': 'User not found'}), 404
+    user = row.User
     
     # Get user's wallet info
     wallet_info = None
@@ -163,30 +250,27 @@ def get_user(user_id):
     if user.membership:
         membership_info = {
             'tier': user.membership.tier.name,
-            'start_date': user.membership.start_date.isoformat(),
-            'end_date': user.membership.end_date.isoformat(),
+            'start_date': user.membership.start_date,
+            'end_date': user.membership.end_date,
             'is_active': user.membership.is_active,
             'is_expired': user.membership.is_expired
         }
     
-    # Get user's referral info
-    referrals = Referral.query.filter_by(referrer_id=user.id).all()
+    # Get user's referral info, counted per level in the database
+    referral_counts = db.session.query(Referral.level, func.count(Referral.id))\
+        .filter_by(referrer_id=user.id)\
+        .group_by(Referral.level)\
+        .all()
+    referrals_by_level = dict(referral_counts)
     referral_info = {
-        'total_referrals': len(referrals),
-        'referrals_by_level': {}
+        'total_referrals': sum(referrals_by_level.values()),
+        'referrals_by_level': referrals_by_level
     }
     
-    for referral in referrals:
-        level = referral.level
-        if level not in referral_info['referrals_by_level']:
-            referral_info['referrals_by_level'][level] = 0
-        referral_info['referrals_by_level'][level] += 1
-    
     # Get user's mission completion stats
     mission_stats = {
-        'total_completed': MissionCompletion.query.filter_by(user_id=user.id).count(),
-        'total_earned': db.session.query(func.sum(MissionCompletion.reward))\
-            .filter_by(user_id=user.id).scalar() or 0
+        'total_completed': row.total_completed,
+        'total_earned': row.total_earned
     }
     
     return jsonify({
@@ -198,13 +282,13 @@ def get_user(user_id):
             'first_name': user.first_name,
             'last_name': user.last_name,
             'profile_picture': user.profile_picture,
-            'date_of_birth': user.date_of_birth.isoformat() if user.date_of_birth else None,
+            'date_of_birth': user.date_of_birth,
             'is_active': user.is_active,
             'is_admin': user.is_admin,
             'email_verified': user.email_verified,
             'phone_verified': user.phone_verified,
-            'created_at': user.created_at.isoformat(),
-            'updated_at': user.updated_at.isoformat()
+            'created_at': user.created_at,
+            'updated_at': user.updated_at
         },
         'wallet': wallet_info,
         'membership': membership_info,
@@ -215,30 +299,18 @@ def get_user(user_id):
 @admin_bp.route('/users/<int:user_id>', methods=['PUT'])
 @admin_required
 def update_user(user_id):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
     data = request.get_json()
     
-    # Update user fields
-    if 'is_active' in data:
-        user.is_active = data['is_active']
-    
-    if 'is_admin' in data:
-        user.is_admin = data['is_admin']
-    
-    if 'email_verified' in data:
-        user.email_verified = data['email_verified']
-    
-    if 'phone_verified' in data:
-        user.phone_verified = data['phone_verified']
+    # Update user fields in place without loading the user
+    if update_row(User, user_id, data, USER_EDITABLE_FIELDS) is None:
+        return jsonify({'error': 'User not found'}), 404
     
     db.session.commit()
+    cache.delete_many(DASHBOARD_CACHE_KEY, admin_status_key(user_id))
     
     return jsonify({
         'message': 'User updated successfully',
-        'user_id': user.id
+        'user_id': user_id
     }), 200
 
 # Mission management
@@ -247,29 +319,37 @@ def update_user(user_id):
 def get_missions():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
-    
-    missions = Mission.query.order_by(Mission.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    result = []
-    for mission in missions.items:
-        result.append({
-            'id': mission.id,
-            'title': mission.title,
-            'description': mission.description,
-            'reward': mission.reward,
-            'type': mission.type,
-            'is_active': mission.is_active,
-            'created_at': mission.created_at.isoformat(),
-            'completions_count': len(mission.completions)
-        })
-    
-    return jsonify({
-        'missions': result,
-        'total': missions.total,
-        'pages': missions.pages,
-        'current_page': page
-    }), 200
+    cursor = request.args.get('cursor')
+    
+    # Count completions per mission in the database rather than loading them
+    completion_counts = db.session.query(
+            MissionCompletion.mission_id,
+            func.count(MissionCompletion.id).label('count')
+        )\
+        .group_by(MissionCompletion.mission_id)\
+        .subquery()
+    
+    query = db.session.query(
+            Mission.id, Mission.title, Mission.description, Mission.reward,
+            Mission.type, Mission.is_active, Mission.created_at,
+            func.coalesce(completion_counts.c.count, 0).label('completions_count')
+        )\
+        .outerjoin(completion_counts, completion_counts.c.mission_id == Mission.id)
+    
+    # Seek past the cursor when one is given, otherwise fall back to page numbers
+    if cursor is not None:
+        try:
+            missions, next_cursor = keyset_paginate(query, Mission.created_at, Mission.id, cursor, per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        missions_page = query.order_by(Mission.created_at.desc())\
+            .paginate(page=page, per_page=per_page, error_out=False)
+        missions = missions_page.items
+        pagination = {'total': missions_page.total, 'pages': missions_page.pages, 'current_page': page}
+    
+    return stream_json_list('missions', missions, **pagination), 200
 
 @admin_bp.route('/missions', methods=['POST'])
 @admin_required
@@ -296,51 +376,60 @@ def create_mission():
     
     db.session.add(mission)
     db.session.commit()
+    cache.delete(DASHBOARD_CACHE_KEY)
     
     return jsonify({
         'message': 'Mission created successfully',
         'mission_id': mission.id
     }), 201
 
-@admin_bp.route('/missions/<int:mission_id>', methods=['PUT'])
+@admin_bp.route('/missions/bulk', methods=['POST'])
 @admin_required
-def update_mission(mission_id):
-    mission = Mission.query.get(mission_id)
-    if not mission:
-        return jsonify({'error': 'Mission not found'}), 404
-    
+def create_missions_bulk():
     data = request.get_json()
     
-    # Update mission fields
-    if 'title' in data:
-        mission.title = data['title']
-    
-    if 'description' in data:
-        mission.description = data['description']
-    
-    if 'instructions' in data:
-        mission.instructions = data['instructions']
+    if not isinstance(data, list) or not data:
+        return jsonify({'error': 'A non-empty list of missions is required'}), 400
     
-    if 'reward' in data:
-        mission.reward = data['reward']
-    
-    if 'type' in data:
-        mission.type = data['type']
+    # Validate every row before inserting any of them
+    required_fields = ['title', 'description', 'instructions', 'reward', 'type', 'content_url', 'duration']
+    rows = []
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            return jsonify({'error': f'Mission {index} must be an object'}), 400
+        for field in required_fields:
+            if field not in item:
+                return jsonify({'error': f'Mission {index}: {field} is required'}), 400
+        
+        row = {field: item[field] for field in required_fields}
+        row['is_active'] = item.get('is_active', True)
+        rows.append(row)
     
-    if 'content_url' in data:
-        mission.content_url = data['content_url']
+    # Insert all missions as one executemany in a single transaction
+    db.session.bulk_insert_mappings(Mission, rows)
+    db.session.commit()
+    cache.delete(DASHBOARD_CACHE_KEY)
     
-    if 'duration' in data:
-        mission.duration = data['duration']
+    return jsonify({
+        'message': 'Missions created successfully',
+        'created': len(rows)
+    }), 201
+
+@admin_bp.route('/missions/<int:mission_id>', methods=['PUT'])
+@admin_required
+def update_mission(mission_id):
+    data = request.get_json()
     
-    if 'is_active' in data:
-        mission.is_active = data['is_active']
+    # Update mission fields in place without loading the mission
+    if update_row(Mission, mission_id, data, MISSION_EDITABLE_FIELDS) is None:
+        return jsonify({'error': 'Mission not found'}), 404
     
     db.session.commit()
+    cache.delete(DASHBOARD_CACHE_KEY)
     
     return jsonify({
         'message': 'Mission updated successfully',
-        'mission_id': mission.id
+        'mission_id': mission_id
     }), 200
 
 # Withdrawal management
@@ -349,38 +438,35 @@ def update_mission(mission_id):
 def get_withdrawals():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    cursor = request.args.get('cursor')
     status = request.args.get('status')
     
-    query = Withdrawal.query
+    query = db.session.query(
+            Withdrawal.id, Withdrawal.user_id,
+            func.coalesce(User.username, 'Unknown').label('username'),
+            Withdrawal.amount, Withdrawal.method, Withdrawal.status, Withdrawal.account_info,
+            Withdrawal.created_at, Withdrawal.processed_at
+        )\
+        .outerjoin(User, User.id == Withdrawal.user_id)
     
     # Filter by status if provided
     if status:
-        query = query.filter_by(status=status)
-    
-    withdrawals = query.order_by(Withdrawal.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    result = []
-    for withdrawal in withdrawals.items:
-        user = User.query.get(withdrawal.user_id)
-        result.append({
-            'id': withdrawal.id,
-            'user_id': withdrawal.user_id,
-            'username': user.username if user else 'Unknown',
-            'amount': withdrawal.amount,
-            'method': withdrawal.method,
-            'status': withdrawal.status,
-            'account_info': withdrawal.account_info,
-            'created_at': withdrawal.created_at.isoformat(),
-            'processed_at': withdrawal.processed_at.isoformat() if withdrawal.processed_at else None
-        })
-    
-    return jsonify({
-        'withdrawals': result,
-        'total': withdrawals.total,
-        'pages': withdrawals.pages,
-        'current_page': page
-    }), 200
+        query = query.filter(Withdrawal.status == status)
+    
+    # Seek past the cursor when one is given, otherwise fall back to page numbers
+    if cursor is not None:
+        try:
+            withdrawals, next_cursor = keyset_paginate(query, Withdrawal.created_at, Withdrawal.id, cursor, per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        withdrawals_page = query.order_by(Withdrawal.created_at.desc())\
+            .paginate(page=page, per_page=per_page, error_out=False)
+        withdrawals = withdrawals_page.items
+        pagination = {'total': withdrawals_page.total, 'pages': withdrawals_page.pages, 'current_page': page}
+    
+    return stream_json_list('withdrawals', withdrawals, **pagination), 200
 
 @admin_bp.route('/withdrawals/<int:withdrawal_id>', methods=['PUT'])
 @admin_required
@@ -412,6 +498,7 @@ def process_withdrawal(withdrawal_id):
         
         withdrawal.status = new_status
         db.session.commit()
+        cache.delete(DASHBOARD_CACHE_KEY)
     
     return jsonify({
         'message': 'Withdrawal updated successfully',
@@ -435,8 +522,8 @@ def get_membership_tiers():
             'referral_levels': tier.referral_levels,
             'description': tier.description,
             'is_active': tier.is_active,
-            'created_at': tier.created_at.isoformat(),
-            'updated_at': tier.updated_at.isoformat()
+            'created_at': tier.created_at,
+            'updated_at': tier.updated_at
         })
     
     return jsonify({'tiers': result}), 200
@@ -453,8 +540,7 @@ def create_membership_tier():
             return jsonify({'error': f'{field} is required'}), 400
     
     # Check if tier with same name already exists
-    existing_tier = MembershipTier.query.filter_by(name=data['name']).first()
-    if existing_tier:
+    if db.session.query(MembershipTier.query.filter_by(name=data['name']).exists()).scalar():
         return jsonify({'error': 'Membership tier with this name already exists'}), 400
     
     # Create new tier
@@ -469,6 +555,9 @@ def create_membership_tier():
     
     db.session.add(tier)
     db.session.commit()
+    cache.delete(DASHBOARD_CACHE_KEY)
+    invalidate_tier_cache()
+    cache.delete(TIERS_CACHE_KEY)
     
     return jsonify({
         'message': 'Membership tier created successfully',
@@ -478,38 +567,24 @@ def create_membership_tier():
 @admin_bp.route('/membership-tiers/<int:tier_id>', methods=['PUT'])
 @admin_required
 def update_membership_tier(tier_id):
-    tier = MembershipTier.query.get(tier_id)
-    if not tier:
-        return jsonify({'error': 'Membership tier not found'}), 404
-    
     data = request.get_json()
     
-    # Update tier fields
     if 'name' in data:
         # Check if another tier with this name exists
-        existing_tier = MembershipTier.query.filter_by(name=data['name']).first()
-        if existing_tier and existing_tier.id != tier.id:
+        existing_tier_id = db.session.query(MembershipTier.id).filter_by(name=data['name']).scalar()
+        if existing_tier_id is not None and existing_tier_id != tier_id:
             return jsonify({'error': 'Another membership tier with this name already exists'}), 400
-        tier.name = data['name']
-    
-    if 'price' in data:
-        tier.price = data['price']
     
-    if 'daily_missions' in data:
-        tier.daily_missions = data['daily_missions']
-    
-    if 'referral_levels' in data:
-        tier.referral_levels = data['referral_levels']
-    
-    if 'description' in data:
-        tier.description = data['description']
-    
-    if 'is_active' in data:
-        tier.is_active = data['is_active']
+    # Update tier fields in place without loading the tier
+    if update_row(MembershipTier, tier_id, data, TIER_EDITABLE_FIELDS) is None:
+        return jsonify({'error': 'Membership tier not found'}), 404
     
     db.session.commit()
+    cache.delete(DASHBOARD_CACHE_KEY)
+    invalidate_tier_cache()
+    cache.delete(TIERS_CACHE_KEY)
     
     return jsonify({
         'message': 'Membership tier updated successfully',
-        'tier_id': tier.id
+        'tier_id': tier_id
     }), 200
\ No newline at end of file
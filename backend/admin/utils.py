@@ -9,6 +9,8 @@ def get_date_range(days=30):
     start_date = end_date - timedelta(days=days)
     return start_date, end_date
 
+# Period stats aggregate the base tables on demand. No admin route serves them,
+# so there are no materialized views or refresh job to keep in step with them
 def get_revenue_stats(days=30):
     """Get revenue statistics for a given period"""
     start_date, end_date = get_date_range(days)
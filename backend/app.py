@@ -1,25 +1,59 @@
 import os
+from decimal import Decimal
+import orjson
 from flask import Flask
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
 from flask_mail import Mail
+from flask_caching import Cache
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from werkzeug.middleware.proxy_fix import ProxyFix
 from celery import Celery
 
 from config import config
-from models import db
+from models import db, include_schema_object
 
 # Initialize extensions
 jwt = JWTManager()
-migrate = Migrate()
+migrate = Migrate(include_object=include_schema_object)
 mail = Mail()
+cache = Cache()
+limiter = Limiter(key_func=get_remote_address)
+
+class ORJSONProvider(JSONProvider):
+    """JSON provider that serializes responses with orjson"""
+    
+    # Allow int keys such as referral levels
+    option = orjson.OPT_NON_STR_KEYS
+    
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self._default, option=self.option).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of decoding to str and re-encoding
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self._default, option=self.option)
+        return self._app.response_class(body, mimetype='application/json')
 
 def create_celery_app(app=None):
     app = app or create_app(os.getenv('FLASK_CONFIG') or 'default')
     celery = Celery(
         app.import_name,
         backend=app.config['CELERY_RESULT_BACKEND'],
-        broker=app.config['CELERY_BROKER_URL']
+        broker=app.config['CELERY_BROKER_URL'],
+        include=['auth.tasks', 'payment.tasks', 'user.tasks']
     )
     celery.conf.update(app.config)
 
@@ -33,17 +67,36 @@ def create_celery_app(app=None):
 
 def create_app(config_name):
     app = Flask(__name__)
+    app.json = ORJSONProvider(app)
     app.config.from_object(config[config_name])
     
+    # Behind the reverse proxy every request comes from the proxy's address, so
+    # take the client IP from X-Forwarded-For before the limiter keys on it
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+    
     # Initialize extensions with app
     db.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
     mail.init_app(app)
+    cache.init_app(app)
+    limiter.init_app(app)
     CORS(app)
     
-    # Ensure upload directory exists
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # Flag N+1 query patterns while developing
+    if app.debug:
+        try:
+            from nplusone.ext.flask_sqlalchemy import NPlusOne
+            NPlusOne(app)
+        except ImportError:
+            pass
+    
+    # Ensure upload directories exist once, rather than on every upload
+    app.config['BLOG_UPLOAD_DIR'] = os.path.join(app.config['UPLOAD_FOLDER'], 'blog')
+    app.config['PROFILE_PICTURE_DIR'] = os.path.join(app.config['UPLOAD_FOLDER'], 'profile_pictures')
+    for upload_dir in ('BLOG_UPLOAD_DIR', 'PROFILE_PICTURE_DIR'):
+        os.makedirs(app.config[upload_dir], exist_ok=True)
     
     # Register blueprints
     from auth.routes import auth_bp
@@ -64,6 +117,10 @@ def create_app(config_name):
     app.register_blueprint(blog_bp, url_prefix='/api/blog')
     app.register_blueprint(support_bp, url_prefix='/api/support')
     
+    # Configure the shared M-Pesa client used by the payment tasks
+    from payment.mpesa import mpesa_api
+    mpesa_api.init_app(app)
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -74,7 +131,6 @@ def create_app(config_name):
         return {'error': 'Internal server error'}, 500
     
     return app
-celery = create_celery_app()
 
 # Create the Flask app instance in the global scope
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
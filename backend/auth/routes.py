@@ -1,15 +1,21 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-import uuid
-import re
+from datetime import date
+from sqlalchemy import or_
+from sqlalchemy.orm import undefer
 
-from models import db, User, Wallet, Referral
-from auth.utils import send_otp_email, send_otp_sms, validate_email, validate_phone
+from models import db, User, Wallet, Referral, Membership, MembershipTier, get_tier_cached, password_needs_rehash
+from app import limiter
+from auth.utils import validate_email, validate_phone, get_indirect_referrers, membership_claim
+from auth.tasks import send_otp_email, send_otp_sms
 
 auth_bp = Blueprint('auth', __name__)
 
+def is_phone_identifier(identifier):
+    """Check for ASCII digits with an optional leading +, like ^\\+?[0-9]+$"""
+    digits = identifier[1:] if identifier.startswith('+') else identifier
+    return digits.isascii() and digits.isdigit()
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -28,16 +34,32 @@ def register():
     if not validate_phone(data['phone_number']):
         return jsonify({'error': 'Invalid phone number format'}), 400
     
-    # Check if username, email or phone already exists
-    if User.query.filter_by(username=data['username']).first():
+    # Check if username, email or phone already exists, in one query
+    existing_users = db.session.query(User.username, User.email, User.phone_number)\
+        .filter(or_(
+            User.username == data['username'],
+            User.email == data['email'],
+            User.phone_number == data['phone_number']
+        ))\
+        .all()
+    
+    if any(existing.username == data['username'] for existing in existing_users):
         return jsonify({'error': 'Username already exists'}), 400
     
-    if User.query.filter_by(email=data['email']).first():
+    if any(existing.email == data['email'] for existing in existing_users):
         return jsonify({'error': 'Email already exists'}), 400
     
-    if User.query.filter_by(phone_number=data['phone_number']).first():
+    if any(existing.phone_number == data['phone_number'] for existing in existing_users):
         return jsonify({'error': 'Phone number already exists'}), 400
     
+    # Parse date of birth (YYYY-MM-DD)
+    date_of_birth = None
+    if data.get('date_of_birth'):
+        try:
+            date_of_birth = date.fromisoformat(data['date_of_birth'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid date format for date_of_birth'}), 400
+    
     # Create new user
     new_user = User(
         username=data['username'],
@@ -46,47 +68,37 @@ def register():
         first_name=data['first_name'],
         last_name=data['last_name'],
         password=data['password'],  # This will be hashed by the setter
-        date_of_birth=datetime.strptime(data.get('date_of_birth', '1990-01-01'), '%Y-%m-%d') if data.get('date_of_birth') else None
+        date_of_birth=date_of_birth,
+        wallet=Wallet(balance=0, total_earned=0, total_withdrawn=0)
     )
     
-    # Create wallet for user
-    new_wallet = Wallet(balance=0, total_earned=0, total_withdrawn=0)
-    new_user.wallet = new_wallet
+    # Flush the user first so referral rows can point at its id
+    db.session.add(new_user)
+    db.session.flush()
     
     # Handle referral if provided
     referral_code = data.get('referral_code')
     if referral_code:
         referrer = User.query.filter_by(username=referral_code).first()
         if referrer:
-            # Create direct referral (level 1)
-            referral = Referral(referrer_id=referrer.id, referred_id=new_user.id, level=1)
-            db.session.add(referral)
+            # Direct referral (level 1) plus indirect referrals (levels 2-5) for
+            # referrers whose membership allows the level
+            referral_rows = [{'referrer_id': referrer.id, 'referred_id': new_user.id, 'level': 1}]
+            referral_rows += [
+                {'referrer_id': indirect_referrer_id, 'referred_id': new_user.id, 'level': level}
+                for indirect_referrer_id, level in get_indirect_referrers(referrer.id)
+            ]
             
-            # Create indirect referrals (levels 2-5) based on referrer's referrers
-            current_referrer = referrer
-            for level in range(2, 6):  # Up to 5 levels
-                referrer_relation = Referral.query.filter_by(referred_id=current_referrer.id).first()
-                if not referrer_relation:
-                    break
-                
-                indirect_referrer = User.query.get(referrer_relation.referrer_id)
-                if not indirect_referrer:
-                    break
-                
-                # Check if indirect referrer's membership allows this level
-                if indirect_referrer.membership and indirect_referrer.membership.tier.referral_levels >= level:
-                    indirect_referral = Referral(referrer_id=indirect_referrer.id, referred_id=new_user.id, level=level)
-                    db.session.add(indirect_referral)
-                
-                current_referrer = indirect_referrer
+            # Referral has no insert hooks or defaults beyond created_at, so skip the unit of work
+            db.session.bulk_insert_mappings(Referral, referral_rows)
     
-    db.session.add(new_user)
     db.session.commit()
     
     # Generate OTP and send to email and phone
     otp = new_user.generate_otp()
-    send_otp_email(new_user.email, otp)
-    send_otp_sms(new_user.phone_number, otp)
+    db.session.commit()
+    send_otp_email.delay(new_user.email, otp)
+    send_otp_sms.delay(new_user.phone_number, otp)
     
     return jsonify({
         'message': 'User registered successfully',
@@ -102,7 +114,7 @@ def verify_otp():
     if 'user_id' not in data or 'otp' not in data:
         return jsonify({'error': 'User ID and OTP are required'}), 400
     
-    user = User.query.get(data['user_id'])
+    user = db.session.get(User, data['user_id'])
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
@@ -113,7 +125,10 @@ def verify_otp():
         db.session.commit()
         
         # Generate tokens
-        access_token = create_access_token(identity=user.id)
+        membership = user.membership
+        tier = get_tier_cached(membership.tier_id) if membership else None
+        mem = membership_claim(membership.is_active, membership.end_date, tier.daily_missions) if tier else None
+        access_token = create_access_token(identity=user.id, additional_claims={'adm': user.is_admin, 'mem': mem})
         refresh_token = create_refresh_token(identity=user.id)
         
         return jsonify({
@@ -134,35 +149,44 @@ def verify_otp():
         return jsonify({'error': 'Invalid or expired OTP'}), 400
 
 @auth_bp.route('/login', methods=['POST'])
+@limiter.limit(lambda: current_app.config['LOGIN_RATE_LIMIT'])
 def login():
     data = request.get_json()
     
     if 'username' not in data or 'password' not in data:
         return jsonify({'error': 'Username and password are required'}), 400
     
-    # Check if username is actually email or phone
-    if '@' in data['username']:
-        user = User.query.filter_by(email=data['username']).first()
-    elif re.match(r'^\+?[0-9]+$', data['username']):
-        user = User.query.filter_by(phone_number=data['username']).first()
+    # Check if username is actually email or phone (digits with an optional leading +)
+    identifier = data['username']
+    if '@' in identifier:
+        column = User.email
+    elif is_phone_identifier(identifier):
+        column = User.phone_number
     else:
-        user = User.query.filter_by(username=data['username']).first()
+        column = User.username
     
+    # Load the user with the deferred password hash in the same query
+    user = User.query.options(undefer(User.password_hash)).filter(column == identifier).first()
     if not user or not user.verify_password(data['password']):
         return jsonify({'error': 'Invalid username or password'}), 401
     
     if not user.is_active:
         return jsonify({'error': 'Account is disabled'}), 403
     
+    # Upgrade legacy pbkdf2 hashes to Argon2 now that the plaintext is known
+    if password_needs_rehash(user.password_hash):
+        user.password = data['password']
+    
     # Generate OTP for two-factor authentication
     otp = user.generate_otp()
+    db.session.commit()
     
     # Send OTP via email and SMS
     if user.email_verified:
-        send_otp_email(user.email, otp)
+        send_otp_email.delay(user.email, otp)
     
     if user.phone_verified:
-        send_otp_sms(user.phone_number, otp)
+        send_otp_sms.delay(user.phone_number, otp)
     
     return jsonify({
         'message': 'OTP sent for verification',
@@ -174,7 +198,21 @@ def login():
 @jwt_required(refresh=True)
 def refresh():
     current_user_id = get_jwt_identity()
-    access_token = create_access_token(identity=current_user_id)
+    
+    # Re-read admin and membership status so changes apply on the next refresh
+    user = db.session.query(
+            User.is_active, User.is_admin,
+            Membership.is_active.label('membership_active'), Membership.end_date, MembershipTier.daily_missions
+        )\
+        .outerjoin(Membership, Membership.user_id == User.id)\
+        .outerjoin(MembershipTier, MembershipTier.id == Membership.tier_id)\
+        .filter(User.id == current_user_id)\
+        .first()
+    if not user or not user.is_active:
+        return jsonify({'error': 'Account is disabled'}), 403
+    
+    mem = membership_claim(user.membership_active, user.end_date, user.daily_missions)
+    access_token = create_access_token(identity=current_user_id, additional_claims={'adm': user.is_admin, 'mem': mem})
     
     return jsonify({
         'access_token': access_token
@@ -194,9 +232,10 @@ def forgot_password():
     
     # Generate OTP for password reset
     otp = user.generate_otp()
+    db.session.commit()
     
-    # Send OTP via email
-    send_otp_email(user.email, otp, template='password_reset')
+    # Queue OTP email
+    send_otp_email.delay(user.email, otp, template='password_reset')
     
     return jsonify({
         'message': 'Password reset OTP sent',
@@ -210,7 +249,7 @@ def reset_password():
     if 'user_id' not in data or 'otp' not in data or 'new_password' not in data:
         return jsonify({'error': 'User ID, OTP, and new password are required'}), 400
     
-    user = User.query.get(data['user_id'])
+    user = db.session.get(User, data['user_id'])
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
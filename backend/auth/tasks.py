@@ -0,0 +1,83 @@
+from celery import shared_task
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from string import Template
+from flask import current_app, render_template
+from flask_mail import Message
+
+from app import mail
+
+# Shared HTTP session so SMS API calls reuse keep-alive connections
+SMS_SESSION = requests.Session()
+SMS_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.5)
+))
+
+# OTP email bodies rendered once per worker, keyed by template name
+OTP_EMAIL_TEMPLATES = {}
+
+# Stands in for the OTP while the Jinja template is rendered
+OTP_PLACEHOLDER = '__OTP_PLACEHOLDER__'
+
+def get_otp_email_template(template):
+    """Get the email template as a string.Template with an $otp slot.
+
+    The Jinja template is rendered once with a placeholder OTP and cached, so
+    each send is a plain string substitution instead of a Jinja render.
+    """
+    otp_template = OTP_EMAIL_TEMPLATES.get(template)
+    if otp_template is None:
+        html = render_template(f'emails/{template}.html', otp=OTP_PLACEHOLDER)
+        otp_template = Template(html.replace('$', '$$').replace(OTP_PLACEHOLDER, '${otp}'))
+        OTP_EMAIL_TEMPLATES[template] = otp_template
+    return otp_template
+
+@shared_task(name='auth.tasks.send_otp_email', autoretry_for=(Exception,), retry_backoff=True, max_retries=5)
+def send_otp_email(email, otp, template='otp_verification'):
+    """Send OTP via email, retrying with backoff if the mail server fails"""
+    subject = 'ShillEarn Hub - Verification Code'
+    if template == 'password_reset':
+        subject = 'ShillEarn Hub - Password Reset Code'
+    
+    msg = Message(
+        subject,
+        recipients=[email],
+        sender=current_app.config['MAIL_DEFAULT_SENDER']
+    )
+    
+    msg.html = get_otp_email_template(template).substitute(otp=otp)
+    mail.send(msg)
+
+@shared_task(name='auth.tasks.send_otp_sms', bind=True, max_retries=5)
+def send_otp_sms(self, phone, otp):
+    """Send OTP via SMS using Africa's Talking API, retrying with backoff"""
+    # Format phone number to international format if needed
+    if phone.startswith('0'):
+        phone = '+254' + phone[1:]
+    
+    if not current_app.config['AT_API_KEY']:
+        # For development, just log the OTP
+        current_app.logger.info(f"SMS to {phone}: Your ShillEarn Hub verification code is: {otp}")
+        return True
+    
+    url = "https://api.africastalking.com/version1/messaging"
+    headers = {
+        'ApiKey': current_app.config['AT_API_KEY'],
+        'Content-Type': 'application/x-www-form-urlencoded',
+        'Accept': 'application/json'
+    }
+    data = {
+        'username': current_app.config['AT_USERNAME'],
+        'to': phone,
+        'message': f'Your ShillEarn Hub verification code is: {otp}',
+        'from': current_app.config['AT_SHORTCODE']
+    }
+    try:
+        response = SMS_SESSION.post(url, headers=headers, data=data, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
+    return True
@@ -1,77 +1,66 @@
-from flask import current_app, render_template
-from flask_mail import Message
 import re
-import requests
-from models import db, User
-from app import mail
+import calendar
+from datetime import datetime
+from sqlalchemy import select, literal
+from sqlalchemy.orm import aliased
+from models import db, User, Referral, Membership, MembershipTier
+from config import Config
+
+# Deepest referral level that earns a commission
+MAX_REFERRAL_LEVEL = max(Config.REFERRAL_COMMISSION_RATES)
+
+# Validation patterns, compiled once at import
+EMAIL_RE = re.compile(r'^[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}$')
+# Allow +254XXXXXXXXX or 07XXXXXXXX or 01XXXXXXXX format
+PHONE_RE = re.compile(r'^(\+254|0)[17][0-9]{8}$')
 
 def validate_email(email):
     """Validate email format"""
-    pattern = r'^[\w\.-]+@[\w\.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_RE.match(email) is not None
 
 def validate_phone(phone):
     """Validate phone number format (Kenyan format)"""
-    # Allow +254XXXXXXXXX or 07XXXXXXXX or 01XXXXXXXX format
-    pattern = r'^(\+254|0)[17][0-9]{8}$'
-    return re.match(pattern, phone) is not None
+    return PHONE_RE.match(phone) is not None
 
-def send_otp_email(email, otp, template='otp_verification'):
-    """Send OTP via email"""
-    try:
-        subject = 'ShillEarn Hub - Verification Code'
-        if template == 'password_reset':
-            subject = 'ShillEarn Hub - Password Reset Code'
-        
-        msg = Message(
-            subject,
-            recipients=[email],
-            sender=current_app.config['MAIL_DEFAULT_SENDER']
-        )
-        
-        msg.html = render_template(f'emails/{template}.html', otp=otp)
-        mail.send(msg)
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Failed to send email: {str(e)}")
-        return False
+def membership_claim(is_active, end_date, daily_missions):
+    """Build the 'mem' access token claim for an active, unexpired membership.
+
+    Returns None when there is no such membership. Mission endpoints read the
+    claim to skip loading the user on read-only requests.
+    """
+    if not is_active or end_date is None or end_date <= datetime.utcnow():
+        return None
+    return {'daily': daily_missions, 'exp': calendar.timegm(end_date.utctimetuple())}
 
-def send_otp_sms(phone, otp):
-    """Send OTP via SMS using Africa's Talking API"""
-    try:
-        # Format phone number to international format if needed
-        if phone.startswith('0'):
-            phone = '+254' + phone[1:]
-        
-        # This is a placeholder for actual SMS API integration
-        # In production, you would use Africa's Talking or similar service
-        
-        # Example with Africa's Talking
-        # url = "https://api.africastalking.com/version1/messaging"
-        # headers = {
-        #     'ApiKey': current_app.config['AT_API_KEY'],
-        #     'Content-Type': 'application/x-www-form-urlencoded',
-        #     'Accept': 'application/json'
-        # }
-        # data = {
-        #     'username': current_app.config['AT_USERNAME'],
-        #     'to': phone,
-        #     'message': f'Your ShillEarn Hub verification code is: {otp}',
-        #     'from': current_app.config.get('AT_SHORTCODE', '')
-        # }
-        # response = requests.post(url, headers=headers, data=data)
-        # return response.status_code == 200
-        
-        # For development, just log the OTP
-        current_app.logger.info(f"SMS to {phone}: Your ShillEarn Hub verification code is: {otp}")
-        return True
-    except Exception as e:
-        current_app.logger.error(f"Failed to send SMS: {str(e)}")
-        return False
+def get_indirect_referrers(referrer_id):
+    """Get (referrer_id, level) for everyone above referrer_id in the referral chain.
+
+    Walks the direct (level 1) referrals upwards with a single recursive CTE,
+    starting at level 2, and keeps only the ancestors whose membership tier
+    pays out at that level.
+    """
+    chain = select(Referral.referrer_id, literal(2).label('level'))\
+        .where(Referral.referred_id == referrer_id, Referral.level == 1)\
+        .cte('chain', recursive=True)
+    
+    parent = aliased(Referral)
+    chain = chain.union_all(
+        select(parent.referrer_id, chain.c.level + 1)
+            .join(chain, parent.referred_id == chain.c.referrer_id)
+            .where(parent.level == 1, chain.c.level < MAX_REFERRAL_LEVEL)
+    )
+    
+    return db.session.execute(
+        select(chain.c.referrer_id, chain.c.level)
+            .join(Membership, Membership.user_id == chain.c.referrer_id)
+            .join(MembershipTier, MembershipTier.id == Membership.tier_id)
+            .where(MembershipTier.referral_levels >= chain.c.level)
+            .order_by(chain.c.level)
+    ).all()
 
 def generate_referral_code(user_id):
     """Generate a unique referral code for a user"""
-    user = User.query.get(user_id)
+    user = db.session.get(User, user_id)
     if not user:
         return None
     
@@ -2,39 +2,79 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from sqlalchemy import desc
+from sqlalchemy.orm import joinedload
 import os
+import secrets
+import shutil
 from werkzeug.utils import secure_filename
 
-from models import db, BlogPost, User
+from models import db, BlogPost
 from admin.routes import admin_required
+from app import cache
+from pagination import keyset_paginate
 
 blog_bp = Blueprint('blog', __name__)
 
+# Cache key for the published categories response
+CATEGORIES_CACHE_KEY = 'blog_categories_v1'
+
+# Size of the chunks uploads are copied to disk in
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 # Helper function to check allowed file extensions
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
+def save_featured_image(file):
+    """Stream an uploaded image into the blog upload folder.
+
+    Returns the public URL of the saved file, or None if the upload is not
+    an image. A random prefix keeps concurrent uploads of the same name apart.
+    """
+    if not file.mimetype or not file.mimetype.startswith('image/'):
+        return None
+    
+    unique_filename = f"{secrets.token_hex(8)}_{secure_filename(file.filename)}"
+    file_path = os.path.join(current_app.config['BLOG_UPLOAD_DIR'], unique_filename)
+    
+    # Copy in large chunks straight from the request stream
+    with open(file_path, 'wb') as destination:
+        shutil.copyfileobj(file.stream, destination, UPLOAD_CHUNK_SIZE)
+    
+    return f"/uploads/blog/{unique_filename}"
+
 # Get all blog posts (public)
 @blog_bp.route('/', methods=['GET'])
 def get_blog_posts():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
+    cursor = request.args.get('cursor')
     category = request.args.get('category')
     
-    query = BlogPost.query.filter_by(is_published=True)
+    # Load authors in the same query instead of one lookup per post
+    query = BlogPost.query.options(joinedload(BlogPost.author)).filter_by(is_published=True)
     
     # Filter by category if provided
     if category:
         query = query.filter_by(category=category)
     
-    # Order by published date (newest first)
-    posts = query.order_by(desc(BlogPost.published_at))\
-        .paginate(page=page, per_page=per_page, error_out=False)
+    # Order by published date (newest first), seeking past the cursor when one is given
+    if cursor is not None:
+        try:
+            posts, next_cursor = keyset_paginate(query, BlogPost.published_at, BlogPost.id, cursor, per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        posts_page = query.order_by(desc(BlogPost.published_at))\
+            .paginate(page=page, per_page=per_page, error_out=False)
+        posts = posts_page.items
+        pagination = {'total': posts_page.total, 'pages': posts_page.pages, 'current_page': page}
     
     result = []
-    for post in posts.items:
-        author = User.query.get(post.author_id)
+    for post in posts:
+        author = post.author
         result.append({
             'id': post.id,
             'title': post.title,
@@ -50,21 +90,19 @@ def get_blog_posts():
             }
         })
     
-    return jsonify({
-        'posts': result,
-        'total': posts.total,
-        'pages': posts.pages,
-        'current_page': page
-    }), 200
+    return jsonify({'posts': result, **pagination}), 200
 
 # Get a single blog post by slug (public)
 @blog_bp.route('/<slug>', methods=['GET'])
 def get_blog_post(slug):
-    post = BlogPost.query.filter_by(slug=slug, is_published=True).first()
+    # Load the author in the same query
+    post = BlogPost.query.options(joinedload(BlogPost.author))\
+        .filter_by(slug=slug, is_published=True)\
+        .first()
     if not post:
         return jsonify({'error': 'Blog post not found'}), 404
     
-    author = User.query.get(post.author_id)
+    author = post.author
     
     return jsonify({
         'id': post.id,
@@ -85,6 +123,7 @@ def get_blog_post(slug):
 
 # Get blog categories (public)
 @blog_bp.route('/categories', methods=['GET'])
+@cache.cached(timeout=300, key_prefix=CATEGORIES_CACHE_KEY)
 def get_categories():
     # Get distinct categories from blog posts
     categories = db.session.query(BlogPost.category)\
@@ -107,7 +146,8 @@ def admin_get_posts():
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status')  # 'published' or 'draft'
     
-    query = BlogPost.query
+    # Load authors in the same query instead of one lookup per post
+    query = BlogPost.query.options(joinedload(BlogPost.author))
     
     # Filter by status if provided
     if status == 'published':
@@ -120,7 +160,7 @@ def admin_get_posts():
     
     result = []
     for post in posts.items:
-        author = User.query.get(post.author_id)
+        author = post.author
         result.append({
             'id': post.id,
             'title': post.title,
@@ -158,8 +198,7 @@ def create_post():
             return jsonify({'error': f'{field} is required'}), 400
     
     # Check if slug already exists
-    existing_post = BlogPost.query.filter_by(slug=data['slug']).first()
-    if existing_post:
+    if db.session.query(BlogPost.query.filter_by(slug=data['slug']).exists()).scalar():
         return jsonify({'error': 'A post with this slug already exists'}), 400
     
     # Handle featured image upload
@@ -167,14 +206,7 @@ def create_post():
     if 'featured_image' in request.files:
         file = request.files['featured_image']
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Create a unique filename to avoid overwriting
-            unique_filename = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{filename}"
-            # Save file to upload folder
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'blog', unique_filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            file.save(file_path)
-            featured_image = f"/uploads/blog/{unique_filename}"
+            featured_image = save_featured_image(file)
     
     # Get current user as author
     current_user_id = get_jwt_identity()
@@ -197,6 +229,7 @@ def create_post():
     
     db.session.add(post)
     db.session.commit()
+    cache.delete(CATEGORIES_CACHE_KEY)
     
     return jsonify({
         'message': 'Blog post created successfully',
@@ -220,8 +253,8 @@ def update_post(post_id):
     
     if 'slug' in data:
         # Check if slug already exists on another post
-        existing_post = BlogPost.query.filter_by(slug=data['slug']).first()
-        if existing_post and existing_post.id != post.id:
+        slug_taken = BlogPost.query.filter(BlogPost.slug == data['slug'], BlogPost.id != post.id).exists()
+        if db.session.query(slug_taken).scalar():
             return jsonify({'error': 'Another post with this slug already exists'}), 400
         post.slug = data['slug']
     
@@ -238,19 +271,14 @@ def update_post(post_id):
     if 'featured_image' in request.files:
         file = request.files['featured_image']
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Create a unique filename to avoid overwriting
-            unique_filename = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{filename}"
-            # Save file to upload folder
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'blog', unique_filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            file.save(file_path)
+            new_image = save_featured_image(file)
             
             # Delete old image if exists (optional)
             # if post.featured_image and os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], post.featured_image.lstrip('/'))):
             #     os.remove(os.path.join(current_app.config['UPLOAD_FOLDER'], post.featured_image.lstrip('/')))
             
-            post.featured_image = f"/uploads/blog/{unique_filename}"
+            if new_image:
+                post.featured_image = new_image
     
     # Handle publishing status change
     if 'is_published' in data:
@@ -264,6 +292,7 @@ def update_post(post_id):
     
     post.updated_at = datetime.utcnow()
     db.session.commit()
+    cache.delete(CATEGORIES_CACHE_KEY)
     
     return jsonify({
         'message': 'Blog post updated successfully',
@@ -284,6 +313,7 @@ def delete_post(post_id):
     
     db.session.delete(post)
     db.session.commit()
+    cache.delete(CATEGORIES_CACHE_KEY)
     
     return jsonify({
         'message': 'Blog post deleted successfully'
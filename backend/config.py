@@ -1,10 +1,20 @@
 import os
 from datetime import timedelta
+from types import MappingProxyType
+from sqlalchemy.pool import NullPool
 
 class Config:
     # Base configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': 20,
+        'max_overflow': 10,
+        # Test connections on checkout so ones dropped while idle are replaced
+        'pool_pre_ping': True,
+        # Well under the idle timeouts of common cloud database proxies
+        'pool_recycle': 1800
+    }
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
@@ -17,10 +27,44 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@shillearnhub.com'
     
+    # SMS settings (Africa's Talking); OTPs are only logged when AT_API_KEY is unset
+    AT_API_KEY = os.environ.get('AT_API_KEY')
+    AT_USERNAME = os.environ.get('AT_USERNAME') or 'sandbox'
+    AT_SHORTCODE = os.environ.get('AT_SHORTCODE') or ''
+    
     # Redis and Celery
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     CELERY_BROKER_URL = REDIS_URL
     CELERY_RESULT_BACKEND = REDIS_URL
+    CELERYBEAT_SCHEDULE = {
+        'process-mpesa-callbacks': {
+            'task': 'payment.tasks.process_mpesa_callbacks',
+            'schedule': 2.0
+        }
+    }
+    # Keep mail, SMS, payments and image processing on their own queues,
+    # e.g. celery worker -Q email_queue --concurrency=2
+    CELERY_ROUTES = {
+        'auth.tasks.send_otp_email': {'queue': 'email_queue'},
+        'auth.tasks.send_otp_sms': {'queue': 'sms_queue'},
+        'payment.tasks.initiate_stk_push': {'queue': 'payment_queue'},
+        'payment.tasks.process_mpesa_callbacks': {'queue': 'payment_queue'},
+        'user.tasks.finalize_profile_picture': {'queue': 'image_queue'}
+    }
+    
+    # Response caching
+    CACHE_TYPE = 'RedisCache'
+    CACHE_REDIS_URL = REDIS_URL
+    CACHE_DEFAULT_TIMEOUT = 30
+    
+    # Rate limiting, shared across workers through Redis
+    RATELIMIT_STORAGE_URI = REDIS_URL
+    # Each login attempt costs a password hash, so cap attempts per client IP
+    LOGIN_RATE_LIMIT = '10 per minute'
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted, so rate
+    # limits key on the real client IP. Off by default: a client connecting
+    # directly could otherwise spoof the header to dodge the limit
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
     
     # Payment settings
     MPESA_CONSUMER_KEY = os.environ.get('MPESA_CONSUMER_KEY')
@@ -39,51 +83,51 @@ class Config:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload
     
-    # Membership tiers (in KES)
-    MEMBERSHIP_TIERS = {
-        'basic': {
+    # Membership tiers (in KES), read-only so they can be shared safely
+    MEMBERSHIP_TIERS = MappingProxyType({
+        'basic': MappingProxyType({
             'price': 3500,  # KSh per year
             'daily_missions': 1,
             'referral_levels': 3
-        },
-        'plus': {
+        }),
+        'plus': MappingProxyType({
             'price': 10500,  # KSh per year
             'daily_missions': 3,
             'referral_levels': 3
-        },
-        'pro': {
+        }),
+        'pro': MappingProxyType({
             'price': 14000,  # KSh per year
             'daily_missions': 4,
             'referral_levels': 4
-        },
-        'prime': {
+        }),
+        'prime': MappingProxyType({
             'price': 35000,  # KSh per year
             'daily_missions': 10,
             'referral_levels': 4
-        },
-        'advanced': {
+        }),
+        'advanced': MappingProxyType({
             'price': 70000,  # KSh per year
             'daily_missions': 20,
             'referral_levels': 4
-        },
-        'max': {
+        }),
+        'max': MappingProxyType({
             'price': 150000,  # KSh per year
             'daily_missions': 40,
             'referral_levels': 5
-        }
-    }
+        })
+    })
     
     # Minimum withdrawal amount (in KES)
     MIN_WITHDRAWAL_AMOUNT = 500
     
     # Referral commission rates (percentage of membership fee)
-    REFERRAL_COMMISSION_RATES = {
+    REFERRAL_COMMISSION_RATES = MappingProxyType({
         1: 10,  # Level 1: 10%
         2: 5,   # Level 2: 5%
         3: 3,   # Level 3: 3%
         4: 2,   # Level 4: 2%
         5: 1    # Level 5: 1%
-    }
+    })
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -92,6 +136,9 @@ class DevelopmentConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    CACHE_TYPE = 'SimpleCache'
+    RATELIMIT_STORAGE_URI = 'memory://'
+    SQLALCHEMY_ENGINE_OPTIONS = {'poolclass': NullPool}
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
         'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shillearnhub_test.db')
 
@@ -0,0 +1,37 @@
+"""add trigram indexes for admin user search
+
+Revision ID: 3f1c9a2b7d41
+Revises: 1a7d0c3e9b52
+Create Date: 2026-10-15 09:12:04.318207
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a2b7d41'
+down_revision = '1a7d0c3e9b52'
+branch_labels = None
+depends_on = None
+
+# Columns matched with ILIKE by admin get_users
+TRIGRAM_COLUMNS = ('username', 'email', 'phone_number', 'first_name', 'last_name')
+
+
+def upgrade():
+    # gin_trgm_ops only exists on PostgreSQL, once pg_trgm is installed
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in TRIGRAM_COLUMNS:
+        op.create_index(f'ix_users_{column}_trgm', 'users', [column],
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    
+    for column in TRIGRAM_COLUMNS:
+        op.drop_index(f'ix_users_{column}_trgm', table_name='users')
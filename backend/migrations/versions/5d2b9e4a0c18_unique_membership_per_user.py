@@ -0,0 +1,38 @@
+"""one membership per user
+
+Revision ID: 5d2b9e4a0c18
+Revises: c4e8a1f27d06
+Create Date: 2026-10-15 09:53:02.149583
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2b9e4a0c18'
+down_revision = 'c4e8a1f27d06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep each user's most recent membership row; older rows were already
+    # superseded, since lookups only ever read one membership per user
+    op.execute(
+        'DELETE FROM memberships '
+        'WHERE user_id IS NOT NULL AND id NOT IN ('
+        'SELECT MAX(id) FROM memberships '
+        'WHERE user_id IS NOT NULL '
+        'GROUP BY user_id)'
+    )
+    
+    # The ON CONFLICT (user_id) upsert in payment.tasks needs this unique index
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_memberships_user_id'), 'memberships', ['user_id'],
+                        unique=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_memberships_user_id'), table_name='memberships',
+                      postgresql_concurrently=True)
@@ -0,0 +1,37 @@
+"""add blog post and support ticket columns the routes use
+
+Revision ID: 7e3a5c9d1b24
+Revises: 5d2b9e4a0c18
+Create Date: 2026-10-15 10:02:46.830175
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3a5c9d1b24'
+down_revision = '5d2b9e4a0c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('blog_posts', sa.Column('slug', sa.String(length=128), nullable=True))
+    op.add_column('blog_posts', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('blog_posts', sa.Column('category', sa.String(length=64), nullable=True))
+    op.add_column('blog_posts', sa.Column('featured_image', sa.String(length=255), nullable=True))
+    op.add_column('support_tickets', sa.Column('category', sa.String(length=64), nullable=True))
+    op.add_column('ticket_responses', sa.Column('is_from_admin', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ticket_responses') as batch_op:
+        batch_op.drop_column('is_from_admin')
+    with op.batch_alter_table('support_tickets') as batch_op:
+        batch_op.drop_column('category')
+    with op.batch_alter_table('blog_posts') as batch_op:
+        batch_op.drop_column('featured_image')
+        batch_op.drop_column('category')
+        batch_op.drop_column('summary')
+        batch_op.drop_column('slug')
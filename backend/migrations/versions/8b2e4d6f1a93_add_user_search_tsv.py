@@ -0,0 +1,37 @@
+"""add full-text search column for admin user search
+
+Revision ID: 8b2e4d6f1a93
+Revises: 3f1c9a2b7d41
+Create Date: 2026-10-15 09:27:45.902113
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d6f1a93'
+down_revision = '3f1c9a2b7d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Generated tsvector columns are PostgreSQL only; other databases search with ILIKE
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    
+    op.execute(
+        "ALTER TABLE users ADD COLUMN search_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', "
+        "coalesce(username, '') || ' ' || coalesce(email, '') || ' ' || coalesce(phone_number, '') || ' ' || "
+        "coalesce(first_name, '') || ' ' || coalesce(last_name, ''))) STORED"
+    )
+    op.create_index('users_search_tsv_idx', 'users', ['search_tsv'], postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    
+    op.drop_index('users_search_tsv_idx', table_name='users')
+    op.drop_column('users', 'search_tsv')
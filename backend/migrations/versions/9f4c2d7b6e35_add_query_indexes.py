@@ -0,0 +1,64 @@
+"""add indexes for the hot query paths
+
+Revision ID: 9f4c2d7b6e35
+Revises: 7e3a5c9d1b24
+Create Date: 2026-10-15 10:14:29.361508
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f4c2d7b6e35'
+down_revision = '7e3a5c9d1b24'
+branch_labels = None
+depends_on = None
+
+# Partial index predicates, spelled for each dialect as in models.py
+ACTIVE_ONLY = {'postgresql_where': sa.text('is_active = true'), 'sqlite_where': sa.text('is_active = 1')}
+PENDING_ONLY = {'postgresql_where': sa.text("status = 'pending'"), 'sqlite_where': sa.text("status = 'pending'")}
+
+# (name, table, columns, extra index options), matching models.py
+INDEXES = (
+    ('ix_users_created_at', 'users', ['created_at'], {}),
+    ('memberships_active_tier_idx', 'memberships', ['tier_id'], ACTIVE_ONLY),
+    ('ix_missions_active', 'missions', ['is_active'], {}),
+    ('ix_mission_completions_completed_at', 'mission_completions', ['completed_at'], {}),
+    ('ix_mc_user_completed', 'mission_completions', ['user_id', 'completed_at', 'id'], {}),
+    ('ix_mc_user_mission_completed', 'mission_completions', ['user_id', 'mission_id', 'completed_at'], {}),
+    ('referrals_referrer_level_idx', 'referrals', ['referrer_id', 'level', 'created_at', 'id'], {}),
+    ('referrals_referred_level_idx', 'referrals', ['referred_id', 'level'], {}),
+    ('ix_referral_commission_referral', 'referral_commissions', ['referral_id'], {}),
+    ('ix_wallets_user_id', 'wallets', ['user_id'], {}),
+    ('ix_wallet_tx_wallet_created', 'wallet_transactions', ['wallet_id', 'created_at', 'id'], {}),
+    ('ix_withdrawals_status', 'withdrawals', ['status'], {}),
+    ('ix_withdrawals_created_at', 'withdrawals', ['created_at'], {}),
+    ('ix_withdrawals_processed_at', 'withdrawals', ['processed_at'], {}),
+    ('withdrawals_pending_idx', 'withdrawals', ['created_at'], PENDING_ONLY),
+    ('withdrawals_status_processed_at_idx', 'withdrawals', ['status', 'processed_at'], {}),
+    ('ix_withdrawal_user_created', 'withdrawals', ['user_id', 'created_at', 'id'], {}),
+    ('ix_withdrawal_user_pending', 'withdrawals', ['user_id', 'created_at', 'id'], PENDING_ONLY),
+    ('ix_payments_reference', 'payments', ['reference'], {}),
+    ('ix_payments_completed_at', 'payments', ['completed_at'], {}),
+    ('ix_payment_user_created', 'payments', ['user_id', 'created_at', 'id'], {}),
+    ('ix_blogpost_pub_date', 'blog_posts', ['is_published', 'published_at', 'id'], {}),
+    ('ix_blogpost_slug_pub', 'blog_posts', ['slug', 'is_published'], {}),
+    ('ix_ticket_user_created', 'support_tickets', ['user_id', 'created_at', 'id'], {}),
+    ('ix_ticket_updated', 'support_tickets', ['updated_at', 'id'], {}),
+    ('ix_ticket_response_ticket_created', 'ticket_responses', ['ticket_id', 'created_at'], {}),
+)
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction, and keeps the tables
+    # writable while each index builds
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, **options)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
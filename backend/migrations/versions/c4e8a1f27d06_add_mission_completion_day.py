@@ -0,0 +1,55 @@
+"""add completed_on and one completion per user, mission and day
+
+Revision ID: c4e8a1f27d06
+Revises: 8b2e4d6f1a93
+Create Date: 2026-10-15 09:41:18.527364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a1f27d06'
+down_revision = '8b2e4d6f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('mission_completions', sa.Column('completed_on', sa.Date(), nullable=True))
+    
+    # UTC day of each existing completion
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    completed_day = 'completed_at::date' if is_postgresql else 'date(completed_at)'
+    op.execute(f'UPDATE mission_completions SET completed_on = {completed_day}')
+    
+    # Keep the first completion of a mission per user and day, so the
+    # constraint can be added over rows written before it existed
+    op.execute(
+        'DELETE FROM mission_completions '
+        'WHERE completed_on IS NOT NULL AND id NOT IN ('
+        'SELECT MIN(id) FROM mission_completions '
+        'WHERE completed_on IS NOT NULL '
+        'GROUP BY user_id, mission_id, completed_on)'
+    )
+    
+    if is_postgresql:
+        # Build the index without blocking completions, then attach it as the constraint
+        with op.get_context().autocommit_block():
+            op.create_index('uq_mc_user_mission_day', 'mission_completions',
+                            ['user_id', 'mission_id', 'completed_on'],
+                            unique=True, postgresql_concurrently=True)
+        op.execute(
+            'ALTER TABLE mission_completions ADD CONSTRAINT uq_mc_user_mission_day '
+            'UNIQUE USING INDEX uq_mc_user_mission_day'
+        )
+    else:
+        with op.batch_alter_table('mission_completions') as batch_op:
+            batch_op.create_unique_constraint('uq_mc_user_mission_day', ['user_id', 'mission_id', 'completed_on'])
+
+
+def downgrade():
+    with op.batch_alter_table('mission_completions') as batch_op:
+        batch_op.drop_constraint('uq_mc_user_mission_day', type_='unique')
+        batch_op.drop_column('completed_on')
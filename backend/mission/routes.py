@@ -1,17 +1,33 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from datetime import datetime
+from sqlalchemy.orm import joinedload, selectinload
 
-from models import db, User, Mission, MissionCompletion
-from mission.utils import validate_mission_completion
+from models import db, User, Mission, MissionCompletion, Membership, get_tier_cached, upsert_insert
+from timeutils import day_range
+from pagination import keyset_paginate
+from streaming import row_to_dict
+from mission.utils import validate_mission_completion, count_completed_today
 
 mission_bp = Blueprint('mission', __name__)
 
+def has_membership_claim():
+    """Check the access token for an active membership that has not expired since issue"""
+    membership = get_jwt().get('mem')
+    return membership is not None and datetime.utcfromtimestamp(membership['exp']) > datetime.utcnow()
+
+def load_member(user_id, with_wallet=False):
+    """Load a user with membership, and optionally wallet, in one query"""
+    options = [joinedload(User.membership)]
+    if with_wallet:
+        options.append(joinedload(User.wallet))
+    return db.session.get(User, user_id, options=options)
+
 @mission_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_available_missions():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_member(current_user_id)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -25,32 +41,16 @@ def get_available_missions():
             'daily_limit': 0
         }), 403
     
-    # Get available missions
-    available_missions = user.get_available_missions()
-    
-    # Get completed missions for today
-    today = datetime.utcnow().date()
-    completed_today = MissionCompletion.query.filter(
-        MissionCompletion.user_id == user.id,
-        db.func.date(MissionCompletion.completed_at) == today
-    ).count()
+    # Count today's completions once and share the count with the missions lookup
+    completed_today = count_completed_today(user.id)
+    available_missions = user.get_available_missions(completed_today=completed_today)
     
     # Get daily mission limit from membership tier
-    daily_limit = user.membership.tier.daily_missions
-    
-    result = []
-    for mission in available_missions:
-        result.append({
-            'id': mission.id,
-            'title': mission.title,
-            'description': mission.description,
-            'reward': mission.reward,
-            'type': mission.type,
-            'duration': mission.duration
-        })
+    tier = get_tier_cached(user.membership.tier_id)
+    daily_limit = tier.daily_missions if tier else 0
     
     return jsonify({
-        'missions': result,
+        'missions': [row_to_dict(mission) for mission in available_missions],
         'completed_today': completed_today,
         'daily_limit': daily_limit
     }), 200
@@ -59,26 +59,28 @@ def get_available_missions():
 @jwt_required()
 def get_mission_details(mission_id):
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
     
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
-    # Check if user has active membership
-    if not user.membership or not user.membership.is_active or user.membership.is_expired:
-        return jsonify({'error': 'Active membership required'}), 403
+    # Trust the token's membership claim; only check the database when it has none,
+    # e.g. the membership was bought after the token was issued
+    if not has_membership_claim():
+        membership = Membership.query.filter_by(user_id=current_user_id).first()
+        if not membership or not membership.is_active or membership.is_expired:
+            return jsonify({'error': 'Active membership required'}), 403
     
     mission = Mission.query.get(mission_id)
     if not mission or not mission.is_active:
         return jsonify({'error': 'Mission not found'}), 404
     
     # Check if mission is already completed today
-    today = datetime.utcnow().date()
-    already_completed = MissionCompletion.query.filter(
-        MissionCompletion.user_id == user.id,
-        MissionCompletion.mission_id == mission.id,
-        db.func.date(MissionCompletion.completed_at) == today
-    ).first() is not None
+    today_start, tomorrow_start = day_range()
+    already_completed = db.session.query(
+        MissionCompletion.query.filter(
+            MissionCompletion.user_id == current_user_id,
+            MissionCompletion.mission_id == mission.id,
+            MissionCompletion.completed_at >= today_start,
+            MissionCompletion.completed_at < tomorrow_start
+        ).exists()
+    ).scalar()
     
     if already_completed:
         return jsonify({'error': 'Mission already completed today'}), 400
@@ -100,7 +102,7 @@ def get_mission_details(mission_id):
 @jwt_required()
 def complete_mission(mission_id):
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = load_member(current_user_id, with_wallet=True)
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -113,25 +115,11 @@ def complete_mission(mission_id):
     if not mission or not mission.is_active:
         return jsonify({'error': 'Mission not found'}), 404
     
-    # Check if mission is already completed today
-    today = datetime.utcnow().date()
-    already_completed = MissionCompletion.query.filter(
-        MissionCompletion.user_id == user.id,
-        MissionCompletion.mission_id == mission.id,
-        db.func.date(MissionCompletion.completed_at) == today
-    ).first() is not None
-    
-    if already_completed:
-        return jsonify({'error': 'Mission already completed today'}), 400
-    
     # Check if user has reached daily mission limit
-    completed_today = MissionCompletion.query.filter(
-        MissionCompletion.user_id == user.id,
-        db.func.date(MissionCompletion.completed_at) == today
-    ).count()
+    completed_today = count_completed_today(user.id)
     
-    daily_limit = user.membership.tier.daily_missions
-    if completed_today >= daily_limit:
+    tier = get_tier_cached(user.membership.tier_id)
+    if not tier or completed_today >= tier.daily_missions:
         return jsonify({'error': 'Daily mission limit reached'}), 400
     
     # Validate mission completion
@@ -141,50 +129,71 @@ def complete_mission(mission_id):
     if not validate_mission_completion(mission, proof):
         return jsonify({'error': 'Invalid mission completion proof'}), 400
     
-    # Create mission completion record
-    completion = MissionCompletion(
-        user_id=user.id,
-        mission_id=mission.id,
-        reward=mission.reward,
-        proof=proof
-    )
+    # Record the completion; the per-day unique constraint rejects a repeat atomically
+    now = datetime.utcnow()
+    completion_id = db.session.execute(
+        upsert_insert(MissionCompletion)
+            .values(
+                user_id=user.id,
+                mission_id=mission.id,
+                reward=mission.reward,
+                proof=proof,
+                completed_at=now,
+                completed_on=now.date()
+            )
+            .on_conflict_do_nothing()
+            .returning(MissionCompletion.id)
+    ).scalar()
+    
+    if completion_id is None:
+        db.session.rollback()
+        return jsonify({'error': 'Mission already completed today'}), 400
     
     # Add reward to user's wallet
     user.wallet.add_funds(
         amount=mission.reward,
         description=f"Reward for completing mission: {mission.title}"
     )
-    
-    db.session.add(completion)
+    wallet_balance = user.wallet.balance
     db.session.commit()
     
     return jsonify({
         'message': 'Mission completed successfully',
         'reward': mission.reward,
-        'wallet_balance': user.wallet.balance
+        'wallet_balance': wallet_balance
     }), 200
 
 @mission_bp.route('/history', methods=['GET'])
 @jwt_required()
 def get_mission_history():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
     
     # Get query parameters
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
-    
-    # Get mission completions with pagination
-    completions = MissionCompletion.query.filter_by(user_id=user.id).order_by(
-        MissionCompletion.completed_at.desc()
-    ).paginate(page=page, per_page=per_page)
+    cursor = request.args.get('cursor')
+    
+    # Load the page's missions in one IN query, reading only the columns shown
+    query = MissionCompletion.query\
+        .options(selectinload(MissionCompletion.mission).load_only(Mission.id, Mission.title, Mission.type))\
+        .filter_by(user_id=current_user_id)
+    
+    # Newest first, seeking past the cursor when one is given
+    if cursor is not None:
+        try:
+            completions, next_cursor = keyset_paginate(query, MissionCompletion.completed_at, MissionCompletion.id, cursor, per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        completions_page = query.order_by(MissionCompletion.completed_at.desc())\
+            .paginate(page=page, per_page=per_page)
+        completions = completions_page.items
+        pagination = {'total': completions_page.total, 'pages': completions_page.pages, 'current_page': page}
     
     result = []
-    for completion in completions.items:
-        mission = Mission.query.get(completion.mission_id)
+    for completion in completions:
+        mission = completion.mission
         if mission:
             result.append({
                 'id': completion.id,
@@ -195,9 +204,4 @@ def get_mission_history():
                 'type': mission.type
             })
     
-    return jsonify({
-        'completions': result,
-        'total': completions.total,
-        'pages': completions.pages,
-        'current_page': page
-    }), 200
\ No newline at end of file
+    return jsonify({'completions': result, **pagination}), 200
\ No newline at end of file
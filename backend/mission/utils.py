@@ -1,83 +1,90 @@
-from flask import current_app
-import json
-import re
+from flask import current_app, g
+from datetime import datetime, timedelta
+import orjson
+from sqlalchemy import func, case, and_
+
+from models import db, MissionCompletion
+from timeutils import day_range
+
+# Proofs that are not a JSON object, or hold values of the wrong type
+INVALID_PROOF_ERRORS = (orjson.JSONDecodeError, TypeError, AttributeError)
+
+def validate_ad_proof(mission, proof_data):
+    """For ad watching, proof is the view duration"""
+    view_duration = proof_data.get('duration', 0)
+    return view_duration >= mission.duration * 0.9  # 90% of required duration
+
+def validate_social_proof(mission, proof_data):
+    """For social engagement, proof is the engagement ID"""
+    engagement_id = proof_data.get('engagement_id')
+    platform = proof_data.get('platform')
+    
+    # In a real implementation, you would verify with the platform API
+    # For now, just check if values are provided
+    return bool(engagement_id and platform)
+
+def validate_survey_proof(mission, proof_data):
+    """For surveys, proof is the survey responses"""
+    responses = proof_data.get('responses', [])
+    
+    # Check if all required questions have answers
+    return len(responses) > 0
+
+# Proof validators by mission type
+PROOF_VALIDATORS = {
+    'ad': validate_ad_proof,
+    'social': validate_social_proof,
+    'survey': validate_survey_proof
+}
 
 def validate_mission_completion(mission, proof):
     """Validate mission completion based on mission type and proof"""
     if not proof:
         return False
     
-    # Different validation logic based on mission type
-    if mission.type == 'ad':
-        # For ad watching, proof might be view duration
-        try:
-            proof_data = json.loads(proof)
-            view_duration = proof_data.get('duration', 0)
-            return view_duration >= mission.duration * 0.9  # 90% of required duration
-        except:
-            return False
-    
-    elif mission.type == 'social':
-        # For social engagement, proof might be engagement ID
-        try:
-            proof_data = json.loads(proof)
-            engagement_id = proof_data.get('engagement_id')
-            platform = proof_data.get('platform')
-            
-            # In a real implementation, you would verify with the platform API
-            # For now, just check if values are provided
-            return bool(engagement_id and platform)
-        except:
-            return False
-    
-    elif mission.type == 'survey':
-        # For surveys, proof might be survey responses
-        try:
-            proof_data = json.loads(proof)
-            responses = proof_data.get('responses', [])
-            
-            # Check if all required questions have answers
-            return len(responses) > 0
-        except:
-            return False
+    validator = PROOF_VALIDATORS.get(mission.type)
     
     # Default validation for other mission types
-    return True
+    if validator is None:
+        return True
+    
+    try:
+        return validator(mission, orjson.loads(proof))
+    except INVALID_PROOF_ERRORS:
+        return False
+
+def count_completed_today(user_id):
+    """Count the user's mission completions today, querying at most once per request"""
+    counts = g.setdefault('completed_today', {})
+    if user_id not in counts:
+        today_start, tomorrow_start = day_range()
+        counts[user_id] = MissionCompletion.query.filter(
+            MissionCompletion.user_id == user_id,
+            MissionCompletion.completed_at >= today_start,
+            MissionCompletion.completed_at < tomorrow_start
+        ).count()
+    return counts[user_id]
 
 def get_mission_stats(user_id):
     """Get mission completion statistics for a user"""
-    from models import db, MissionCompletion
-    from datetime import datetime, timedelta
-    
-    # Get today's completions
     today = datetime.utcnow().date()
-    today_count = MissionCompletion.query.filter(
-        MissionCompletion.user_id == user_id,
-        db.func.date(MissionCompletion.completed_at) == today
-    ).count()
-    
-    # Get this week's completions
-    week_start = today - timedelta(days=today.weekday())
-    week_count = MissionCompletion.query.filter(
-        MissionCompletion.user_id == user_id,
-        db.func.date(MissionCompletion.completed_at) >= week_start
-    ).count()
-    
-    # Get this month's completions
-    month_start = today.replace(day=1)
-    month_count = MissionCompletion.query.filter(
-        MissionCompletion.user_id == user_id,
-        db.func.date(MissionCompletion.completed_at) >= month_start
-    ).count()
+    today_start, tomorrow_start = day_range(today)
+    week_start, _ = day_range(today - timedelta(days=today.weekday()))
+    month_start, _ = day_range(today.replace(day=1))
     
-    # Get total earnings from missions
-    total_earnings = db.session.query(db.func.sum(MissionCompletion.reward)).filter(
-        MissionCompletion.user_id == user_id
-    ).scalar() or 0
+    # Count today's, this week's and this month's completions and sum all earnings in one scan
+    stats = db.session.query(
+            func.count(case((and_(MissionCompletion.completed_at >= today_start, MissionCompletion.completed_at < tomorrow_start), MissionCompletion.id))).label('today'),
+            func.count(case((MissionCompletion.completed_at >= week_start, MissionCompletion.id))).label('this_week'),
+            func.count(case((MissionCompletion.completed_at >= month_start, MissionCompletion.id))).label('this_month'),
+            func.coalesce(func.sum(MissionCompletion.reward), 0).label('total_earnings')
+        )\
+        .filter(MissionCompletion.user_id == user_id)\
+        .one()
     
     return {
-        'today': today_count,
-        'this_week': week_count,
-        'this_month': month_count,
-        'total_earnings': total_earnings
+        'today': stats.today,
+        'this_week': stats.this_week,
+        'this_month': stats.this_month,
+        'total_earnings': stats.total_earnings
     }
\ No newline at end of file
@@ -1,19 +1,90 @@
+from collections import namedtuple
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import select, literal, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import deferred, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+import base64
+import functools
+import hmac
+import secrets
+import time
 import uuid
-import pyotp
+
+from timeutils import day_range
 
 db = SQLAlchemy()
 
+def upsert_insert(model):
+    """Build an INSERT for the session's dialect that supports ON CONFLICT clauses"""
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    return dialect.insert(model)
+
+# Argon2id parameters (OWASP minimum: 19 MiB, 2 iterations, 1 lane)
+PASSWORD_HASHER = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+def verify_password_hash(password_hash, password):
+    """Check a password against an Argon2 hash, or a legacy Werkzeug pbkdf2 hash"""
+    if not password_hash:
+        return False
+    if not password_hash.startswith('$argon2'):
+        return check_password_hash(password_hash, password)
+    try:
+        return PASSWORD_HASHER.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+OTP_INTERVAL = 600  # Seconds each OTP stays valid
+
+@functools.lru_cache(maxsize=1024)
+def otp_key(otp_secret):
+    """Decode a base32 OTP secret into HMAC key bytes"""
+    return base64.b32decode(otp_secret, casefold=True)
+
+def totp_code(otp_secret, for_time=None):
+    """Compute the 6-digit RFC 6238 TOTP code (HMAC-SHA1) for the current interval"""
+    counter = int(time.time() if for_time is None else for_time) // OTP_INTERVAL
+    mac = hmac.new(otp_key(otp_secret), counter.to_bytes(8, 'big'), 'sha1').digest()
+    offset = mac[-1] & 0xf
+    code = (int.from_bytes(mac[offset:offset + 4], 'big') & 0x7fffffff) % 1000000
+    return f'{code:06d}'
+
+def password_needs_rehash(password_hash):
+    """Whether a stored hash is legacy pbkdf2 or uses outdated Argon2 parameters"""
+    return not password_hash.startswith('$argon2') or PASSWORD_HASHER.check_needs_rehash(password_hash)
+
+def pg_trgm_installed(ddl, target, bind, **kw):
+    """Whether the pg_trgm extension is installed, so gin_trgm_ops indexes can be created"""
+    return bind.execute(db.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Trigram indexes so admin ILIKE '%term%' searches avoid full scans. The
+        # migration 3f1c9a2b7d41 creates them along with the pg_trgm extension;
+        # create_all only adds them where the extension is already installed
+        db.Index('ix_users_username_trgm', 'username', postgresql_using='gin',
+                 postgresql_ops={'username': 'gin_trgm_ops'}).ddl_if(dialect='postgresql', callable_=pg_trgm_installed),
+        db.Index('ix_users_email_trgm', 'email', postgresql_using='gin',
+                 postgresql_ops={'email': 'gin_trgm_ops'}).ddl_if(dialect='postgresql', callable_=pg_trgm_installed),
+        db.Index('ix_users_phone_number_trgm', 'phone_number', postgresql_using='gin',
+                 postgresql_ops={'phone_number': 'gin_trgm_ops'}).ddl_if(dialect='postgresql', callable_=pg_trgm_installed),
+        db.Index('ix_users_first_name_trgm', 'first_name', postgresql_using='gin',
+                 postgresql_ops={'first_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql', callable_=pg_trgm_installed),
+        db.Index('ix_users_last_name_trgm', 'last_name', postgresql_using='gin',
+                 postgresql_ops={'last_name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql', callable_=pg_trgm_installed),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, index=True)
     email = db.Column(db.String(120), unique=True, index=True)
     phone_number = db.Column(db.String(20), unique=True, index=True)
-    password_hash = db.Column(db.String(128))
+    # Only loaded when a password is checked
+    password_hash = deferred(db.Column(db.String(128)))
     first_name = db.Column(db.String(64))
     last_name = db.Column(db.String(64))
     profile_picture = db.Column(db.String(255))
@@ -24,7 +95,7 @@ class User(db.Model):
     otp_valid_until = db.Column(db.DateTime)
     email_verified = db.Column(db.Boolean, default=False)
     phone_verified = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
@@ -33,11 +104,11 @@ class User(db.Model):
     missions_completed = db.relationship('MissionCompletion', backref='user')
     referrals = db.relationship('Referral', backref='referrer', foreign_keys='Referral.referrer_id')
     referred_by = db.relationship('Referral', backref='referred', foreign_keys='Referral.referred_id', uselist=False)
-    withdrawals = db.relationship('Withdrawal', backref='user')
+    # Unbounded history; page it with an explicit query instead of loading it here
+    withdrawals = db.relationship('Withdrawal', backref='user', lazy='raise')
     
     def __init__(self, **kwargs):
         super(User, self).__init__(**kwargs)
-        self.otp_secret = pyotp.random_base32()
         if self.wallet is None:
             self.wallet = Wallet(balance=0)
     
@@ -47,78 +118,112 @@ class User(db.Model):
     
     @password.setter
     def password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = PASSWORD_HASHER.hash(password)
     
     def verify_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password_hash(self.password_hash, password)
     
     def generate_otp(self):
-        """Generate a new OTP valid for 10 minutes"""
-        self.otp_valid_until = datetime.utcnow() + timedelta(minutes=10)
-        totp = pyotp.TOTP(self.otp_secret, interval=600)  # 10 minutes
-        return totp.now()
+        """Generate a new OTP valid for 10 minutes, creating the OTP secret on first use"""
+        if not self.otp_secret:
+            self.otp_secret = base64.b32encode(secrets.token_bytes(10)).decode('ascii')
+        self.otp_valid_until = datetime.utcnow() + timedelta(seconds=OTP_INTERVAL)
+        return totp_code(self.otp_secret)
     
     def verify_otp(self, otp):
         """Verify the provided OTP"""
-        if datetime.utcnow() > self.otp_valid_until:
+        if not self.otp_secret or datetime.utcnow() > self.otp_valid_until:
             return False
-        totp = pyotp.TOTP(self.otp_secret, interval=600)  # 10 minutes
-        return totp.verify(otp)
+        return hmac.compare_digest(str(otp), totp_code(self.otp_secret))
     
     def get_referral_tree(self, max_depth=None):
         """Get the user's referral tree up to max_depth levels"""
         if max_depth is None:
-            if self.membership:
-                max_depth = self.membership.tier.referral_levels
-            else:
-                max_depth = 0
+            tier = get_tier_cached(self.membership.tier_id) if self.membership else None
+            max_depth = tier.referral_levels if tier else 0
         
         if max_depth <= 0:
             return []
         
-        result = []
-        direct_referrals = Referral.query.filter_by(referrer_id=self.id).all()
+        # Fetch the whole subtree of direct (level 1) referrals in one recursive query
+        tree = select(Referral.referrer_id, Referral.referred_id, literal(1).label('depth'))\
+            .where(Referral.referrer_id == self.id, Referral.level == 1)\
+            .cte('referral_tree', recursive=True)
+        
+        child = aliased(Referral)
+        tree = tree.union_all(
+            select(child.referrer_id, child.referred_id, tree.c.depth + 1)
+                .join(tree, child.referrer_id == tree.c.referred_id)
+                .where(child.level == 1, tree.c.depth < max_depth)
+        )
         
-        for referral in direct_referrals:
-            referred_user = User.query.get(referral.referred_id)
-            result.append({
+        rows = db.session.query(User, tree.c.referrer_id, tree.c.depth)\
+            .join(tree, User.id == tree.c.referred_id)\
+            .order_by(tree.c.depth, User.id)\
+            .all()
+        
+        # Group nodes under their referrer, then link each node to its own referrals
+        nodes_by_referrer = {}
+        for referred_user, referrer_id, depth in rows:
+            nodes_by_referrer.setdefault(referrer_id, []).append({
                 'user': referred_user,
-                'level': 1,
-                'referrals': referred_user.get_referral_tree(max_depth - 1) if max_depth > 1 else []
+                'level': depth,
+                'referrals': []
             })
         
-        return result
+        for nodes in nodes_by_referrer.values():
+            for node in nodes:
+                node['referrals'] = nodes_by_referrer.get(node['user'].id, [])
+        
+        return nodes_by_referrer.get(self.id, [])
     
-    def get_available_missions(self):
-        """Get missions available to the user based on their membership tier"""
+    def get_available_missions(self, completed_today=None):
+        """Get missions available to the user based on their membership tier.
+
+        Returns rows of the listing columns (id, title, description, reward,
+        type, duration) rather than Mission objects. Pass completed_today when
+        the caller already counted today's completions to skip counting them again.
+        """
         if not self.membership or not self.membership.is_active:
             return []
         
         # Get completed missions for today
-        today = datetime.utcnow().date()
-        completed_today = MissionCompletion.query.filter(
-            MissionCompletion.user_id == self.id,
-            db.func.date(MissionCompletion.completed_at) == today
-        ).count()
+        today_start, tomorrow_start = day_range()
+        if completed_today is None:
+            completed_today = MissionCompletion.query.filter(
+                MissionCompletion.user_id == self.id,
+                MissionCompletion.completed_at >= today_start,
+                MissionCompletion.completed_at < tomorrow_start
+            ).count()
         
         # Check if user has reached their daily mission limit
-        daily_limit = self.membership.tier.daily_missions
-        if completed_today >= daily_limit:
+        tier = get_tier_cached(self.membership.tier_id)
+        if not tier or completed_today >= tier.daily_missions:
             return []
         
-        # Get available missions
-        available_missions = Mission.query.filter(
-            Mission.is_active == True,
-            ~Mission.id.in_(
-                db.session.query(MissionCompletion.mission_id).filter(
-                    MissionCompletion.user_id == self.id,
-                    db.func.date(MissionCompletion.completed_at) == today
-                )
-            )
-        ).limit(daily_limit - completed_today).all()
+        # Get available missions, excluding today's completions with an anti-join
+        available_missions = Mission.query\
+            .with_entities(Mission.id, Mission.title, Mission.description, Mission.reward, Mission.type, Mission.duration)\
+            .outerjoin(MissionCompletion, db.and_(
+                MissionCompletion.mission_id == Mission.id,
+                MissionCompletion.user_id == self.id,
+                MissionCompletion.completed_at >= today_start,
+                MissionCompletion.completed_at < tomorrow_start
+            ))\
+            .filter(Mission.is_active == True, MissionCompletion.mission_id == None)\
+            .limit(daily_limit - completed_today)\
+            .all()
         
         return available_missions
 
+# Schema objects that migrations create on PostgreSQL but the models do not
+# map, such as the users.search_tsv full-text column and its GIN index
+UNMAPPED_SCHEMA_OBJECTS = frozenset({('column', 'search_tsv'), ('index', 'users_search_tsv_idx')})
+
+def include_schema_object(object, name, type_, reflected, compare_to):
+    """Alembic include_object hook so autogenerate leaves UNMAPPED_SCHEMA_OBJECTS alone"""
+    return not (reflected and compare_to is None and (type_, name) in UNMAPPED_SCHEMA_OBJECTS)
+
 class MembershipTier(db.Model):
     __tablename__ = 'membership_tiers'
     
@@ -135,11 +240,55 @@ class MembershipTier(db.Model):
     # Relationships
     memberships = db.relationship('Membership', backref='tier')
 
+TierInfo = namedtuple('TierInfo', 'id name price daily_missions referral_levels is_active')
+
+# Bumped on every tier change so cached tier snapshots go stale in every worker
+TIER_CACHE_VERSION_KEY = 'membership_tier_version'
+TIER_CACHE_TIMEOUT = 300
+
+def get_tier_cached(tier_id):
+    """Get a read-only snapshot of a membership tier from the shared cache.
+
+    Tiers are few and rarely change, so hot paths read them from here instead
+    of lazy-loading Membership.tier. Call invalidate_tier_cache() after
+    creating or updating a tier. Returns None for an unknown tier, which is
+    not cached.
+    """
+    # app imports this module, so the cache extension is resolved per call
+    from app import cache
+    
+    version = cache.get(TIER_CACHE_VERSION_KEY) or 0
+    key = f'membership_tier_v{version}_{tier_id}'
+    tier = cache.get(key)
+    if tier is None:
+        row = db.session.query(
+            MembershipTier.id, MembershipTier.name, MembershipTier.price,
+            MembershipTier.daily_missions, MembershipTier.referral_levels, MembershipTier.is_active
+        ).filter(MembershipTier.id == tier_id).first()
+        if not row:
+            return None
+        
+        tier = TierInfo(*row)
+        cache.set(key, tier, timeout=TIER_CACHE_TIMEOUT)
+    return tier
+
+def invalidate_tier_cache():
+    """Make the next get_tier_cached call in any worker read fresh tier rows"""
+    from app import cache
+    
+    cache.inc(TIER_CACHE_VERSION_KEY)
+
 class Membership(db.Model):
     __tablename__ = 'memberships'
+    __table_args__ = (
+        # Only active memberships are counted in the dashboard tier distribution
+        db.Index('memberships_active_tier_idx', 'tier_id',
+                 postgresql_where=db.text('is_active = true'),
+                 sqlite_where=db.text('is_active = 1')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), unique=True, index=True)  # One membership per user
     tier_id = db.Column(db.Integer, db.ForeignKey('membership_tiers.id'))
     start_date = db.Column(db.DateTime, default=datetime.utcnow)
     end_date = db.Column(db.DateTime)
@@ -160,6 +309,9 @@ class Membership(db.Model):
 
 class Mission(db.Model):
     __tablename__ = 'missions'
+    __table_args__ = (
+        db.Index('ix_missions_active', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(128))
@@ -178,12 +330,21 @@ class Mission(db.Model):
 
 class MissionCompletion(db.Model):
     __tablename__ = 'mission_completions'
+    __table_args__ = (
+        # Per-user completions in a time range, and newest-first history pages
+        db.Index('ix_mc_user_completed', 'user_id', 'completed_at', 'id'),
+        # Whether a user completed a given mission in a time range
+        db.Index('ix_mc_user_mission_completed', 'user_id', 'mission_id', 'completed_at'),
+        # A user can complete each mission at most once per (UTC) day
+        db.UniqueConstraint('user_id', 'mission_id', 'completed_on', name='uq_mc_user_mission_day'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     mission_id = db.Column(db.Integer, db.ForeignKey('missions.id'))
     reward = db.Column(db.Integer)  # Actual reward paid
-    completed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    completed_on = db.Column(db.Date, default=lambda: datetime.utcnow().date())  # UTC day of completed_at
     proof = db.Column(db.Text)  # Proof of completion (if needed)
     
     def __init__(self, **kwargs):
@@ -195,6 +356,12 @@ class MissionCompletion(db.Model):
 
 class Referral(db.Model):
     __tablename__ = 'referrals'
+    __table_args__ = (
+        # Per-level referral counts for a referrer, and newest-first referral pages
+        db.Index('referrals_referrer_level_idx', 'referrer_id', 'level', 'created_at', 'id'),
+        # Walking up the referral chain, see auth.utils.get_indirect_referrers
+        db.Index('referrals_referred_level_idx', 'referred_id', 'level'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     referrer_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -207,6 +374,10 @@ class Referral(db.Model):
 
 class ReferralCommission(db.Model):
     __tablename__ = 'referral_commissions'
+    __table_args__ = (
+        # Per-level commission totals, see user.utils.get_referral_stats
+        db.Index('ix_referral_commission_referral', 'referral_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     referral_id = db.Column(db.Integer, db.ForeignKey('referrals.id'))
@@ -214,23 +385,42 @@ class ReferralCommission(db.Model):
     description = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class InsufficientFunds(ValueError):
+    """Raised when a wallet balance does not cover a debit"""
+
 class Wallet(db.Model):
     __tablename__ = 'wallets'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
     balance = db.Column(db.Integer, default=0)  # Balance in KES
     total_earned = db.Column(db.Integer, default=0)  # Total earned in KES
     total_withdrawn = db.Column(db.Integer, default=0)  # Total withdrawn in KES
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    transactions = db.relationship('WalletTransaction', backref='wallet')
+    # Unbounded history; page it with an explicit query instead of loading it here
+    transactions = db.relationship('WalletTransaction', backref='wallet', lazy='raise')
     
     def add_funds(self, amount, description):
-        """Add funds to wallet and create transaction record"""
-        self.balance += amount
-        self.total_earned += amount
+        """Add funds to wallet and create transaction record.
+
+        The balance is incremented in SQL, so concurrent credits cannot
+        overwrite each other.
+        """
+        balance, total_earned = db.session.execute(
+            update(Wallet)
+                .where(Wallet.id == self.id)
+                .values(
+                    balance=Wallet.balance + amount,
+                    total_earned=Wallet.total_earned + amount,
+                    updated_at=datetime.utcnow()
+                )
+                .returning(Wallet.balance, Wallet.total_earned)
+                .execution_options(synchronize_session=False)
+        ).one()
+        set_committed_value(self, 'balance', balance)
+        set_committed_value(self, 'total_earned', total_earned)
         
         transaction = WalletTransaction(
             wallet_id=self.id,
@@ -242,11 +432,21 @@ class Wallet(db.Model):
         return transaction
     
     def deduct_funds(self, amount, description):
-        """Deduct funds from wallet and create transaction record"""
-        if self.balance < amount:
-            raise ValueError("Insufficient funds")
-        
-        self.balance -= amount
+        """Deduct funds from wallet and create transaction record.
+
+        The balance check and the decrement run as one conditional UPDATE,
+        so two concurrent withdrawals cannot overdraw the wallet.
+        """
+        balance = db.session.execute(
+            update(Wallet)
+                .where(Wallet.id == self.id, Wallet.balance >= amount)
+                .values(balance=Wallet.balance - amount, updated_at=datetime.utcnow())
+                .returning(Wallet.balance)
+                .execution_options(synchronize_session=False)
+        ).scalar()
+        if balance is None:
+            raise InsufficientFunds("Insufficient funds")
+        set_committed_value(self, 'balance', balance)
         
         transaction = WalletTransaction(
             wallet_id=self.id,
@@ -259,6 +459,10 @@ class Wallet(db.Model):
 
 class WalletTransaction(db.Model):
     __tablename__ = 'wallet_transactions'
+    __table_args__ = (
+        # Newest-first transaction history for a wallet, seekable by (created_at, id)
+        db.Index('ix_wallet_tx_wallet_created', 'wallet_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     wallet_id = db.Column(db.Integer, db.ForeignKey('wallets.id'))
@@ -270,16 +474,29 @@ class WalletTransaction(db.Model):
 
 class Withdrawal(db.Model):
     __tablename__ = 'withdrawals'
+    __table_args__ = (
+        # Pending withdrawals are a small, hot subset of the table
+        db.Index('withdrawals_pending_idx', 'created_at',
+                 postgresql_where=db.text("status = 'pending'"),
+                 sqlite_where=db.text("status = 'pending'")),
+        db.Index('withdrawals_status_processed_at_idx', 'status', 'processed_at'),
+        # Newest-first withdrawal history for a user, seekable by (created_at, id)
+        db.Index('ix_withdrawal_user_created', 'user_id', 'created_at', 'id'),
+        # A user's pending withdrawals, newest first, without scanning settled ones
+        db.Index('ix_withdrawal_user_pending', 'user_id', 'created_at', 'id',
+                 postgresql_where=db.text("status = 'pending'"),
+                 sqlite_where=db.text("status = 'pending'")),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     amount = db.Column(db.Integer)  # Amount in KES
     method = db.Column(db.String(64))  # mpesa, bank, paypal
-    status = db.Column(db.String(20))  # pending, completed, failed
+    status = db.Column(db.String(20), index=True)  # pending, completed, failed
     reference = db.Column(db.String(128))  # Payment reference
     account_info = db.Column(db.String(255))  # Account info for payment
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    processed_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    processed_at = db.Column(db.DateTime, index=True)
     
     def __init__(self, **kwargs):
         super(Withdrawal, self).__init__(**kwargs)
@@ -288,16 +505,20 @@ class Withdrawal(db.Model):
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        # Newest-first payment history per user, including the keyset tie-breaker on id
+        db.Index('ix_payment_user_created', 'user_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     amount = db.Column(db.Integer)  # Amount in KES
     method = db.Column(db.String(64))  # mpesa, card, paypal
     status = db.Column(db.String(20))  # pending, completed, failed
-    reference = db.Column(db.String(128))  # Payment reference
+    reference = db.Column(db.String(128), index=True)  # Payment reference
     description = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    completed_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime, index=True)
     
     def __init__(self, **kwargs):
         super(Payment, self).__init__(**kwargs)
@@ -306,10 +527,20 @@ class Payment(db.Model):
 
 class BlogPost(db.Model):
     __tablename__ = 'blog_posts'
+    __table_args__ = (
+        # Newest-first public feed, including the keyset tie-breaker on id
+        db.Index('ix_blogpost_pub_date', 'is_published', 'published_at', 'id'),
+        # Public post lookup by slug
+        db.Index('ix_blogpost_slug_pub', 'slug', 'is_published'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(128))
+    slug = db.Column(db.String(128))
+    summary = db.Column(db.Text)
     content = db.Column(db.Text)
+    category = db.Column(db.String(64))
+    featured_image = db.Column(db.String(255))
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     image_url = db.Column(db.String(255))
     is_published = db.Column(db.Boolean, default=False)
@@ -322,10 +553,16 @@ class BlogPost(db.Model):
 
 class SupportTicket(db.Model):
     __tablename__ = 'support_tickets'
+    __table_args__ = (
+        # Newest-first tickets per user, and the admin list by last update
+        db.Index('ix_ticket_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_ticket_updated', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     subject = db.Column(db.String(128))
+    category = db.Column(db.String(64))
     message = db.Column(db.Text)
     status = db.Column(db.String(20))  # open, in_progress, closed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -337,11 +574,16 @@ class SupportTicket(db.Model):
 
 class TicketResponse(db.Model):
     __tablename__ = 'ticket_responses'
+    __table_args__ = (
+        # A ticket's responses in order, and the per-ticket response aggregates
+        db.Index('ix_ticket_response_ticket_created', 'ticket_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     ticket_id = db.Column(db.Integer, db.ForeignKey('support_tickets.id'))
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))  # Can be admin or user
     message = db.Column(db.Text)
+    is_from_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
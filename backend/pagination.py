@@ -0,0 +1,36 @@
+from datetime import datetime
+from sqlalchemy import tuple_
+
+def encode_cursor(timestamp, row_id):
+    """Encode the position of the last row on a page as an opaque cursor"""
+    return f"{timestamp.isoformat()}|{row_id}"
+
+def decode_cursor(cursor):
+    """Decode a cursor into (timestamp, row_id), raising ValueError if malformed"""
+    timestamp, row_id = cursor.split('|')
+    return datetime.fromisoformat(timestamp), int(row_id)
+
+def keyset_paginate(query, order_column, id_column, cursor, per_page, row_key=None):
+    """Fetch a newest-first page of query that starts after cursor.
+
+    Seeks on (order_column, id_column) instead of using OFFSET, so deep pages
+    cost the same as the first one and no COUNT is needed. An empty cursor
+    returns the first page. Returns (items, next_cursor); next_cursor is None
+    on the last page.
+    """
+    if row_key is None:
+        row_key = lambda row: (getattr(row, order_column.key), getattr(row, id_column.key))
+
+    if cursor:
+        query = query.filter(tuple_(order_column, id_column) < decode_cursor(cursor))
+
+    # Fetch one extra row to find out whether another page follows
+    items = query.order_by(order_column.desc(), id_column.desc())\
+        .limit(per_page + 1)\
+        .all()
+
+    if len(items) <= per_page:
+        return items, None
+
+    items = items[:per_page]
+    return items, encode_cursor(*row_key(items[-1]))
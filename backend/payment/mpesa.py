@@ -1,15 +1,31 @@
 import requests
 import base64
 import json
+import time
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 from flask import current_app
 
+from app import cache
+
+# Shared cache key for the OAuth token, so all workers reuse one token
+ACCESS_TOKEN_CACHE_KEY = 'mpesa_access_token'
+
+# STK push timestamps are in Safaricom's local time
+NAIROBI_TZ = ZoneInfo('Africa/Nairobi')
+
+# Refresh tokens this many seconds before Safaricom expires them
+ACCESS_TOKEN_EXPIRY_MARGIN = 60
+
 class MpesaAPI:
     """Class to handle M-Pesa API integration"""
     
     def __init__(self, app=None):
         self.app = app
+        # Keep-alive connections to the M-Pesa API across calls
+        self.session = requests.Session()
+        self._access_token = None
+        self._access_token_expires_at = 0
         if app is not None:
             self.init_app(app)
     
@@ -21,13 +37,25 @@ class MpesaAPI:
         self.passkey = app.config.get('MPESA_PASSKEY')
         self.callback_url = app.config.get('MPESA_CALLBACK_URL')
         
+        # Fixed prefix of every STK push password
+        self._shortcode_passkey = f"{self.business_shortcode}{self.passkey}"
+        
         # API endpoints
         self.auth_url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
         self.stk_push_url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
         self.query_url = "https://sandbox.safaricom.co.ke/mpesa/stkpushquery/v1/query"
     
     def get_access_token(self):
-        """Get OAuth access token"""
+        """Get OAuth access token, reusing a cached one until shortly before it expires"""
+        if self._access_token and time.monotonic() < self._access_token_expires_at:
+            return self._access_token
+        
+        access_token = cache.get(ACCESS_TOKEN_CACHE_KEY)
+        if access_token:
+            # Another worker fetched it; hold it locally for a short while
+            self._remember_access_token(access_token, ACCESS_TOKEN_EXPIRY_MARGIN)
+            return access_token
+        
         auth_string = f"{self.consumer_key}:{self.consumer_secret}"
         auth_bytes = auth_string.encode("ascii")
         encoded_auth = base64.b64encode(auth_bytes).decode("ascii")
@@ -37,18 +65,28 @@ class MpesaAPI:
         }
         
         try:
-            response = requests.get(self.auth_url, headers=headers)
+            response = self.session.get(self.auth_url, headers=headers)
             response_data = response.json()
-            return response_data.get("access_token")
+            access_token = response_data.get("access_token")
+            if access_token:
+                timeout = int(response_data.get("expires_in", 3599)) - ACCESS_TOKEN_EXPIRY_MARGIN
+                if timeout > 0:
+                    cache.set(ACCESS_TOKEN_CACHE_KEY, access_token, timeout=timeout)
+                    self._remember_access_token(access_token, timeout)
+            return access_token
         except Exception as e:
             current_app.logger.error(f"Error getting access token: {str(e)}")
             return None
     
+    def _remember_access_token(self, access_token, timeout):
+        """Keep the token in this process for timeout seconds"""
+        self._access_token = access_token
+        self._access_token_expires_at = time.monotonic() + timeout
+    
     def generate_password(self):
         """Generate password for STK push"""
-        timestamp = datetime.now(pytz.timezone('Africa/Nairobi')).strftime('%Y%m%d%H%M%S')
-        password_str = f"{self.business_shortcode}{self.passkey}{timestamp}"
-        password_bytes = password_str.encode('ascii')
+        timestamp = datetime.now(NAIROBI_TZ).strftime('%Y%m%d%H%M%S')
+        password_bytes = (self._shortcode_passkey + timestamp).encode('ascii')
         return base64.b64encode(password_bytes).decode('utf-8'), timestamp
     
     def initiate_stk_push(self, phone_number, amount, reference, description):
@@ -88,7 +126,7 @@ class MpesaAPI:
         }
         
         try:
-            response = requests.post(self.stk_push_url, json=payload, headers=headers)
+            response = self.session.post(self.stk_push_url, json=payload, headers=headers)
             response_data = response.json()
             
             if response.status_code == 200:
@@ -134,7 +172,7 @@ class MpesaAPI:
         }
         
         try:
-            response = requests.post(self.query_url, json=payload, headers=headers)
+            response = self.session.post(self.query_url, json=payload, headers=headers)
             response_data = response.json()
             
             if response.status_code == 200:
@@ -153,4 +191,7 @@ class MpesaAPI:
             return {
                 "success": False,
                 "message": str(e)
-            }
\ No newline at end of file
+            }
+
+# Shared client, configured by create_app
+mpesa_api = MpesaAPI()
@@ -1,31 +1,47 @@
 from flask import Blueprint, request, jsonify, current_app, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
+import math
 import uuid
 import json
 
-from models import db, User, Payment, Membership, MembershipTier
-from payment.mpesa import MpesaAPI
+from models import db, User, Payment, MembershipTier
+from payment.tasks import initiate_stk_push, enqueue_mpesa_callback, PAYMENT_STATUS_CACHE_KEY, PAYMENT_STATUS_CACHE_TIMEOUT
+from app import cache
+from pagination import keyset_paginate
+from streaming import stream_json_list
 
 payment_bp = Blueprint('payment', __name__)
-mpesa_api = MpesaAPI()
+
+# Fields a payment request must carry
+PAYMENT_REQUIRED_FIELDS = ('tier_id', 'payment_method')
+
+# Rows fetched per round trip while streaming payment history
+PAYMENT_STREAM_BATCH_SIZE = 50
+
+def payment_to_dict(payment):
+    """Serialize a payment for API responses"""
+    return {
+        'payment_id': payment.id,
+        'reference': payment.reference,
+        'amount': payment.amount,
+        'method': payment.method,
+        'status': payment.status,
+        'description': payment.description,
+        'created_at': payment.created_at.isoformat(),
+        'completed_at': payment.completed_at.isoformat() if payment.completed_at else None
+    }
 
 @payment_bp.route('/initialize', methods=['POST'])
 @jwt_required()
 def initialize_payment():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
     data = request.get_json()
     
     # Validate required fields
-    required_fields = ['tier_id', 'payment_method']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'{field} is required'}), 400
+    missing = [field for field in PAYMENT_REQUIRED_FIELDS if field not in data]
+    if missing:
+        return jsonify({'error': f"Missing required fields: {', '.join(missing)}", 'fields': missing}), 400
     
     # Get membership tier
     tier = MembershipTier.query.get(data['tier_id'])
@@ -43,7 +59,7 @@ def initialize_payment():
     
     # Create payment record
     payment = Payment(
-        user_id=user.id,
+        user_id=current_user_id,
         amount=tier.price,
         method=payment_method,
         status='pending',
@@ -56,35 +72,29 @@ def initialize_payment():
     
     # Initialize payment based on method
     if payment_method == 'mpesa':
-        # Validate phone number
-        phone_number = data.get('phone_number', user.phone_number)
+        # Validate phone number, falling back to the one on the account
+        phone_number = data.get('phone_number')
+        if not phone_number:
+            phone_number = db.session.query(User.phone_number).filter_by(id=current_user_id).scalar()
         if not phone_number:
             return jsonify({'error': 'Phone number is required for M-Pesa payment'}), 400
         
-        # Initialize M-Pesa STK push
-        result = mpesa_api.initiate_stk_push(
-            phone_number=phone_number,
-            amount=tier.price,
-            reference=reference,
-            description=f"ShillEarn Hub {tier.name} Membership"
+        # Send the M-Pesa STK push from a worker; a rejected push marks the payment failed
+        initiate_stk_push.delay(
+            payment.id,
+            phone_number,
+            tier.price,
+            reference,
+            f"ShillEarn Hub {tier.name} Membership"
         )
         
-        if result['success']:
-            return jsonify({
-                'payment_id': payment.id,
-                'reference': reference,
-                'amount': tier.price,
-                'status': 'pending',
-                'message': 'Please complete the payment on your phone',
-                'checkout_request_id': result.get('checkout_request_id')
-            }), 200
-        else:
-            payment.status = 'failed'
-            db.session.commit()
-            return jsonify({
-                'error': 'Failed to initiate payment',
-                'message': result.get('message')
-            }), 400
+        return jsonify({
+            'payment_id': payment.id,
+            'reference': reference,
+            'amount': tier.price,
+            'status': 'pending',
+            'message': 'Please complete the payment on your phone'
+        }), 202
     
     elif payment_method == 'card':
         # For demo purposes, we'll just return a URL to a payment page
@@ -117,51 +127,11 @@ def mpesa_callback():
     if not reference:
         return jsonify({'error': 'Missing reference'}), 400
     
-    # Find the payment by reference
-    payment = Payment.query.filter_by(reference=reference).first()
-    if not payment:
-        return jsonify({'error': 'Payment not found'}), 404
-    
-    # Process the callback data
+    # Acknowledge straight away; process_mpesa_callbacks applies callbacks in batches
     result_code = data.get('Body', {}).get('stkCallback', {}).get('ResultCode')
+    enqueue_mpesa_callback(reference, result_code)
     
-    if result_code == 0:  # Success
-        # Update payment status
-        payment.status = 'completed'
-        payment.completed_at = datetime.utcnow()
-        
-        # Create or update membership
-        user = User.query.get(payment.user_id)
-        tier_name = payment.description.split(': ')[1] if ': ' in payment.description else None
-        
-        if tier_name:
-            tier = MembershipTier.query.filter_by(name=tier_name).first()
-            if tier:
-                # Check if user already has a membership
-                if user.membership:
-                    user.membership.tier_id = tier.id
-                    user.membership.start_date = datetime.utcnow()
-                    user.membership.end_date = datetime.utcnow() + timedelta(days=365)
-                    user.membership.is_active = True
-                    user.membership.payment_id = payment.reference
-                else:
-                    # Create new membership
-                    membership = Membership(
-                        user_id=user.id,
-                        tier_id=tier.id,
-                        payment_id=payment.reference
-                    )
-                    db.session.add(membership)
-        
-        db.session.commit()
-        
-        return jsonify({'success': True}), 200
-    else:
-        # Payment failed
-        payment.status = 'failed'
-        db.session.commit()
-        
-        return jsonify({'success': False}), 200
+    return jsonify({'success': result_code == 0}), 200
 
 @payment_bp.route('/status/<payment_id>', methods=['GET'])
 @jwt_required()
@@ -169,26 +139,27 @@ def check_payment_status(payment_id):
     """Check the status of a payment"""
     current_user_id = get_jwt_identity()
     
-    payment = Payment.query.get(payment_id)
-    if not payment or payment.user_id != current_user_id:
+    # Clients poll this while a payment is pending, so serve repeat polls from the cache
+    cache_key = PAYMENT_STATUS_CACHE_KEY.format(payment_id)
+    cached = cache.get(cache_key)
+    if cached is None:
+        payment = db.session.get(Payment, payment_id)
+        if not payment:
+            return jsonify({'error': 'Payment not found'}), 404
+        cached = {'user_id': payment.user_id, 'payment': payment_to_dict(payment)}
+        cache.set(cache_key, cached, timeout=PAYMENT_STATUS_CACHE_TIMEOUT)
+    
+    if cached['user_id'] != current_user_id:
         return jsonify({'error': 'Payment not found'}), 404
     
     # If payment is pending and it's M-Pesa, check status from API
-    if payment.status == 'pending' and payment.method == 'mpesa':
+    payment_info = cached['payment']
+    if payment_info['status'] == 'pending' and payment_info['method'] == 'mpesa':
         # For demo purposes, we'll just return the current status
         # In a real implementation, you would query the M-Pesa API
         pass
     
-    return jsonify({
-        'payment_id': payment.id,
-        'reference': payment.reference,
-        'amount': payment.amount,
-        'method': payment.method,
-        'status': payment.status,
-        'description': payment.description,
-        'created_at': payment.created_at.isoformat(),
-        'completed_at': payment.completed_at.isoformat() if payment.completed_at else None
-    }), 200
+    return jsonify(payment_info), 200
 
 @payment_bp.route('/history', methods=['GET'])
 @jwt_required()
@@ -198,27 +169,25 @@ def payment_history():
     
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    cursor = request.args.get('cursor')
     
-    payments = Payment.query.filter_by(user_id=current_user_id)\
-        .order_by(Payment.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
+    query = Payment.query.filter_by(user_id=current_user_id)
     
-    result = []
-    for payment in payments.items:
-        result.append({
-            'payment_id': payment.id,
-            'reference': payment.reference,
-            'amount': payment.amount,
-            'method': payment.method,
-            'status': payment.status,
-            'description': payment.description,
-            'created_at': payment.created_at.isoformat(),
-            'completed_at': payment.completed_at.isoformat() if payment.completed_at else None
-        })
-    
-    return jsonify({
-        'payments': result,
-        'total': payments.total,
-        'pages': payments.pages,
-        'current_page': page
-    }), 200
\ No newline at end of file
+    # Newest first, seeking past the cursor without a COUNT when one is given
+    if cursor is not None:
+        try:
+            payments, next_cursor = keyset_paginate(query, Payment.created_at, Payment.id, cursor, per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        page, per_page = max(page, 1), max(per_page, 1)
+        total = query.count()
+        pagination = {'total': total, 'pages': math.ceil(total / per_page), 'current_page': page}
+        # Fetch the page in batches while it is streamed out
+        payments = query.order_by(Payment.created_at.desc())\
+            .limit(per_page)\
+            .offset((page - 1) * per_page)\
+            .yield_per(PAYMENT_STREAM_BATCH_SIZE)
+    
+    return stream_json_list('payments', payments, serialize=payment_to_dict, **pagination), 200
\ No newline at end of file
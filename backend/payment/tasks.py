@@ -0,0 +1,212 @@
+import functools
+from datetime import datetime, timedelta
+import orjson
+import redis
+from celery import shared_task
+from flask import current_app
+from sqlalchemy import update
+
+from models import db, Payment, Membership, MembershipTier, upsert_insert
+from payment.mpesa import mpesa_api
+from app import cache
+
+# Redis list the M-Pesa callback endpoint appends to and process_mpesa_callbacks drains
+MPESA_CALLBACK_QUEUE = 'mpesa_callbacks'
+
+# Most callbacks applied in one transaction
+MPESA_CALLBACK_BATCH_SIZE = 500
+
+# Failed attempts per raw callback, and where callbacks go once they run out
+MPESA_CALLBACK_ATTEMPTS = 'mpesa_callbacks:attempts'
+MPESA_CALLBACK_DEAD_LETTER_QUEUE = 'mpesa_callbacks:dead'
+MPESA_CALLBACK_MAX_ATTEMPTS = 5
+
+# Seconds a worker holds its processing list before the lock lapses
+MPESA_CALLBACK_LOCK_TIMEOUT = 60
+
+# Cached status responses for polled payments, dropped whenever a payment settles
+PAYMENT_STATUS_CACHE_KEY = 'payment_status_v1:{}'
+PAYMENT_STATUS_CACHE_TIMEOUT = 30
+
+def invalidate_payment_status(payment_ids):
+    """Drop the cached status of each payment in payment_ids"""
+    if payment_ids:
+        cache.delete_many(*[PAYMENT_STATUS_CACHE_KEY.format(payment_id) for payment_id in payment_ids])
+
+@functools.lru_cache(maxsize=None)
+def redis_client(url):
+    """Get a shared Redis client for url"""
+    return redis.Redis.from_url(url)
+
+def enqueue_mpesa_callback(reference, result_code):
+    """Buffer an M-Pesa callback for the next batch"""
+    callback = {'reference': reference, 'result_code': result_code, 'received_at': datetime.utcnow().isoformat()}
+    redis_client(current_app.config['REDIS_URL']).rpush(MPESA_CALLBACK_QUEUE, orjson.dumps(callback))
+
+@shared_task(name='payment.tasks.initiate_stk_push')
+def initiate_stk_push(payment_id, phone_number, amount, reference, description):
+    """Send the M-Pesa STK push for a pending payment, failing the payment if Safaricom rejects it"""
+    result = mpesa_api.initiate_stk_push(
+        phone_number=phone_number,
+        amount=amount,
+        reference=reference,
+        description=description
+    )
+    
+    if result['success']:
+        return result.get('checkout_request_id')
+    
+    current_app.logger.warning(f"STK push failed for payment {reference}: {result.get('message')}")
+    db.session.execute(
+        update(Payment)
+            .where(Payment.id == payment_id, Payment.status == 'pending')
+            .values(status='failed')
+    )
+    db.session.commit()
+    invalidate_payment_status([payment_id])
+    return None
+
+@shared_task(bind=True, name='payment.tasks.process_mpesa_callbacks')
+def process_mpesa_callbacks(self):
+    """Apply buffered M-Pesa callbacks in batches, one transaction per batch.
+
+    Each batch is moved into this worker's processing list with LMOVE and only
+    removed once its transaction commits, so a batch cut short by a crash is
+    applied again on the worker's next run. Settling only touches pending
+    payments, so re-applying a callback is harmless. A failing batch is retried
+    one callback at a time, and a callback that fails MPESA_CALLBACK_MAX_ATTEMPTS
+    times is moved to the dead-letter list for inspection.
+    """
+    client = redis_client(current_app.config['REDIS_URL'])
+    processing = f'{MPESA_CALLBACK_QUEUE}:processing:{self.request.hostname}'
+    
+    # Runs overlap when a batch outlasts the beat interval; keep one per worker
+    lock = client.lock(f'{processing}:lock', timeout=MPESA_CALLBACK_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+    
+    processed = 0
+    try:
+        # Finish a batch left behind by an interrupted run before claiming more
+        raw_callbacks = client.lrange(processing, 0, -1)
+        while True:
+            if not raw_callbacks:
+                raw_callbacks = claim_mpesa_callbacks(client, processing)
+            if not raw_callbacks:
+                return processed
+            
+            apply_mpesa_callback_batch(client, processing, raw_callbacks)
+            processed += len(raw_callbacks)
+            raw_callbacks = None
+            lock.reacquire()
+    finally:
+        lock.release()
+
+def claim_mpesa_callbacks(client, processing):
+    """Move up to a batch of callbacks from the front of the queue into processing"""
+    count = min(client.llen(MPESA_CALLBACK_QUEUE), MPESA_CALLBACK_BATCH_SIZE)
+    if not count:
+        return []
+    
+    pipeline = client.pipeline(transaction=False)
+    for _ in range(count):
+        pipeline.lmove(MPESA_CALLBACK_QUEUE, processing, 'LEFT', 'RIGHT')
+    return [raw for raw in pipeline.execute() if raw is not None]
+
+def apply_mpesa_callback_batch(client, processing, raw_callbacks):
+    """Apply a claimed batch in one transaction, falling back to one callback at a time"""
+    try:
+        apply_mpesa_callbacks([orjson.loads(raw) for raw in raw_callbacks])
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('M-Pesa callback batch failed, retrying its callbacks one at a time')
+        for raw in raw_callbacks:
+            apply_mpesa_callback(client, processing, raw)
+        return
+    
+    pipeline = client.pipeline()
+    pipeline.delete(processing)
+    pipeline.hdel(MPESA_CALLBACK_ATTEMPTS, *raw_callbacks)
+    pipeline.execute()
+
+def apply_mpesa_callback(client, processing, raw):
+    """Apply one claimed callback, requeueing or dead-lettering it if it fails"""
+    pipeline = client.pipeline()
+    try:
+        apply_mpesa_callbacks([orjson.loads(raw)])
+    except Exception:
+        db.session.rollback()
+        attempts = client.hincrby(MPESA_CALLBACK_ATTEMPTS, raw, 1)
+        if attempts >= MPESA_CALLBACK_MAX_ATTEMPTS:
+            current_app.logger.exception(f'M-Pesa callback failed {attempts} times, moving it to {MPESA_CALLBACK_DEAD_LETTER_QUEUE}')
+            pipeline.rpush(MPESA_CALLBACK_DEAD_LETTER_QUEUE, raw)
+            pipeline.hdel(MPESA_CALLBACK_ATTEMPTS, raw)
+        else:
+            pipeline.rpush(MPESA_CALLBACK_QUEUE, raw)
+    else:
+        pipeline.hdel(MPESA_CALLBACK_ATTEMPTS, raw)
+    pipeline.lrem(processing, 1, raw)
+    pipeline.execute()
+
+def payment_tier_name(payment):
+    """Tier name from a membership payment description, e.g. "Membership: Gold" """
+    description = payment.description or ''
+    return description.split(': ')[1] if ': ' in description else None
+
+def apply_mpesa_callbacks(callbacks):
+    """Settle the pending payments named in callbacks and grant their memberships"""
+    references = {callback['reference'] for callback in callbacks}
+    payments = {
+        payment.reference: payment
+        for payment in Payment.query.filter(Payment.reference.in_(references), Payment.status == 'pending')
+    }
+    
+    # Tier names come from the payment description, e.g. "Membership: Gold"
+    completed = [
+        payments[callback['reference']] for callback in callbacks
+        if callback['result_code'] == 0 and callback['reference'] in payments
+    ]
+    tier_names = {payment_tier_name(payment) for payment in completed} - {None}
+    tiers = {tier.name: tier for tier in MembershipTier.query.filter(MembershipTier.name.in_(tier_names))} if tier_names else {}
+    
+    # Latest membership grant per user; one upsert row each
+    memberships = {}
+    settled_ids = []
+    for callback in callbacks:
+        payment = payments.get(callback['reference'])
+        if payment is None or payment.status != 'pending':
+            # Unknown reference, or a duplicate callback for a settled payment
+            continue
+        
+        settled_ids.append(payment.id)
+        if callback['result_code'] != 0:
+            payment.status = 'failed'
+            continue
+        
+        now = datetime.fromisoformat(callback['received_at'])
+        payment.status = 'completed'
+        payment.completed_at = now
+        
+        tier = tiers.get(payment_tier_name(payment))
+        if tier:
+            memberships[payment.user_id] = {
+                'user_id': payment.user_id,
+                'tier_id': tier.id,
+                'start_date': now,
+                'end_date': now + timedelta(days=365),
+                'is_active': True,
+                'payment_id': payment.reference,
+                'created_at': now,
+                'updated_at': now
+            }
+    
+    # Create or replace each user's membership in one statement
+    if memberships:
+        stmt = upsert_insert(Membership).values(list(memberships.values()))
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[Membership.user_id],
+            set_={column: stmt.excluded[column] for column in ('tier_id', 'start_date', 'end_date', 'is_active', 'payment_id', 'updated_at')}
+        ))
+    
+    db.session.commit()
+    invalidate_payment_status(settled_ids)
@@ -0,0 +1,27 @@
+from flask import Response, current_app, stream_with_context
+
+def row_to_dict(row):
+    """Convert a column-query Row into a plain dict"""
+    return dict(row._mapping)
+
+def stream_json_list(key, rows, serialize=row_to_dict, **fields):
+    """Stream {key: [rows...], **fields} as a chunked JSON response.
+
+    Each row is serialized and sent as it is reached, so the full list of
+    response dicts is never held in memory at once. Extra fields such as
+    pagination metadata are written after the list.
+    """
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield '{' + dumps(key) + ':['
+        for index, row in enumerate(rows):
+            if index:
+                yield ','
+            yield dumps(serialize(row))
+        yield ']'
+        for name, value in fields.items():
+            yield ',' + dumps(name) + ':' + dumps(value)
+        yield '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
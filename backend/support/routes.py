@@ -1,13 +1,44 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-from sqlalchemy import desc
+from sqlalchemy import desc, func, case
+from sqlalchemy.orm import joinedload
 
-from models import db, SupportTicket, TicketResponse, User
+from models import db, SupportTicket, TicketResponse
 from admin.routes import admin_required
+from pagination import keyset_paginate
+from app import cache
 
 support_bp = Blueprint('support', __name__)
 
+# Fields a new ticket must carry
+TICKET_REQUIRED_FIELDS = ('subject', 'message', 'category')
+
+# Bumped on every ticket change so cached admin ticket lists go stale at once
+TICKETS_CACHE_VERSION_KEY = 'admin_tickets_version'
+
+def admin_tickets_cache_key(*args, **kwargs):
+    """Cache key for one admin ticket list query at the current tickets version"""
+    version = cache.get(TICKETS_CACHE_VERSION_KEY) or 0
+    query = '&'.join(f'{name}={value}' for name, value in sorted(request.args.items(multi=True)))
+    return f'admin_tickets_v{version}:{query}'
+
+# Cache key for the list of ticket categories in use
+TICKET_CATEGORIES_CACHE_KEY = 'ticket_categories_v1'
+
+def get_ticket_categories():
+    """Get the distinct ticket categories, cached for 10 minutes"""
+    categories = cache.get(TICKET_CATEGORIES_CACHE_KEY)
+    if categories is None:
+        rows = db.session.query(SupportTicket.category).distinct().all()
+        categories = [row[0] for row in rows if row[0]]
+        cache.set(TICKET_CATEGORIES_CACHE_KEY, categories, timeout=600)
+    return categories
+
+def invalidate_admin_tickets():
+    """Make the next admin ticket list request read fresh data"""
+    cache.inc(TICKETS_CACHE_VERSION_KEY)
+
 # User routes for support tickets
 
 # Get user's tickets
@@ -18,6 +49,7 @@ def get_user_tickets():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     status = request.args.get('status')  # 'open', 'closed', 'all'
+    cursor = request.args.get('cursor')
     
     query = SupportTicket.query.filter_by(user_id=current_user_id)
     
@@ -27,20 +59,37 @@ def get_user_tickets():
     elif status == 'closed':
         query = query.filter_by(status='closed')
     
-    tickets = query.order_by(desc(SupportTicket.created_at))\
-        .paginate(page=page, per_page=per_page, error_out=False)
+    # Response count and latest response time per ticket, for this user's tickets only
+    response_totals = db.session.query(
+            TicketResponse.ticket_id,
+            func.count(TicketResponse.id).label('response_count'),
+            func.max(TicketResponse.created_at).label('latest_response')
+        )\
+        .join(SupportTicket, SupportTicket.id == TicketResponse.ticket_id)\
+        .filter(SupportTicket.user_id == current_user_id)\
+        .group_by(TicketResponse.ticket_id)\
+        .subquery()
+    
+    # Load them in the same query as the tickets
+    query = query.outerjoin(response_totals, response_totals.c.ticket_id == SupportTicket.id)\
+        .add_columns(response_totals.c.response_count, response_totals.c.latest_response)
+    
+    # Newest first, seeking past the cursor without a COUNT when one is given
+    if cursor is not None:
+        try:
+            tickets, next_cursor = keyset_paginate(query, SupportTicket.created_at, SupportTicket.id, cursor, per_page,
+                                                   row_key=lambda row: (row[0].created_at, row[0].id))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        tickets_page = query.order_by(desc(SupportTicket.created_at))\
+            .paginate(page=page, per_page=per_page, error_out=False)
+        tickets = tickets_page.items
+        pagination = {'total': tickets_page.total, 'pages': tickets_page.pages, 'current_page': page}
     
     result = []
-    for ticket in tickets.items:
-        # Count responses
-        response_count = TicketResponse.query.filter_by(ticket_id=ticket.id).count()
-        
-        # Get latest response date
-        latest_response = TicketResponse.query\
-            .filter_by(ticket_id=ticket.id)\
-            .order_by(desc(TicketResponse.created_at))\
-            .first()
-        
+    for ticket, response_count, latest_response in tickets:
         result.append({
             'id': ticket.id,
             'subject': ticket.subject,
@@ -48,16 +97,11 @@ def get_user_tickets():
             'status': ticket.status,
             'created_at': ticket.created_at.isoformat(),
             'updated_at': ticket.updated_at.isoformat(),
-            'response_count': response_count,
-            'latest_response': latest_response.created_at.isoformat() if latest_response else None
+            'response_count': response_count or 0,
+            'latest_response': latest_response.isoformat() if latest_response else None
         })
     
-    return jsonify({
-        'tickets': result,
-        'total': tickets.total,
-        'pages': tickets.pages,
-        'current_page': page
-    }), 200
+    return jsonify({'tickets': result, **pagination}), 200
 
 # Create a new support ticket
 @support_bp.route('/tickets', methods=['POST'])
@@ -67,10 +111,9 @@ def create_ticket():
     data = request.get_json()
     
     # Validate required fields
-    required_fields = ['subject', 'message', 'category']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'{field} is required'}), 400
+    missing = [field for field in TICKET_REQUIRED_FIELDS if field not in data]
+    if missing:
+        return jsonify({'error': f"Missing required fields: {', '.join(missing)}", 'fields': missing}), 400
     
     # Create new ticket
     ticket = SupportTicket(
@@ -93,6 +136,11 @@ def create_ticket():
     
     db.session.add(response)
     db.session.commit()
+    invalidate_admin_tickets()
+    
+    # A ticket in a new category makes the cached category list stale
+    if ticket.category not in get_ticket_categories():
+        cache.delete(TICKET_CATEGORIES_CACHE_KEY)
     
     return jsonify({
         'message': 'Support ticket created successfully',
@@ -114,17 +162,15 @@ def get_ticket(ticket_id):
     if ticket.user_id != current_user_id:
         return jsonify({'error': 'Unauthorized access to ticket'}), 403
     
-    # Get ticket responses
-    responses = TicketResponse.query\
+    # Get ticket responses, loading each author in the same query
+    responses = TicketResponse.query.options(joinedload(TicketResponse.user))\
         .filter_by(ticket_id=ticket.id)\
         .order_by(TicketResponse.created_at)\
         .all()
     
     response_list = []
     for resp in responses:
-        # Get user info for response
-        user = User.query.get(resp.user_id)
-        
+        user = resp.user
         response_list.append({
             'id': resp.id,
             'message': resp.message,
@@ -186,6 +232,7 @@ def respond_to_ticket(ticket_id):
     
     db.session.add(response)
     db.session.commit()
+    invalidate_admin_tickets()
     
     return jsonify({
         'message': 'Response added successfully',
@@ -216,6 +263,7 @@ def close_ticket(ticket_id):
     ticket.updated_at = datetime.utcnow()
     
     db.session.commit()
+    invalidate_admin_tickets()
     
     return jsonify({
         'message': 'Ticket closed successfully'
@@ -226,10 +274,12 @@ def close_ticket(ticket_id):
 # Get all tickets (admin)
 @support_bp.route('/admin/tickets', methods=['GET'])
 @admin_required
+@cache.cached(timeout=10, make_cache_key=admin_tickets_cache_key)
 def admin_get_tickets():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status')  # 'open', 'closed', 'all'
+    cursor = request.args.get('cursor')
     category = request.args.get('category')
     
     query = SupportTicket.query
@@ -244,22 +294,38 @@ def admin_get_tickets():
     if category:
         query = query.filter_by(category=category)
     
-    tickets = query.order_by(desc(SupportTicket.updated_at))\
-        .paginate(page=page, per_page=per_page, error_out=False)
+    # Response count and whether an admin replied, per ticket
+    response_totals = db.session.query(
+            TicketResponse.ticket_id,
+            func.count(TicketResponse.id).label('response_count'),
+            func.max(case((TicketResponse.is_from_admin == True, 1), else_=0)).label('admin_responded')
+        )\
+        .group_by(TicketResponse.ticket_id)\
+        .subquery()
+    
+    # Load each ticket's owner and response totals in the same query
+    query = query.options(joinedload(SupportTicket.user))\
+        .outerjoin(response_totals, response_totals.c.ticket_id == SupportTicket.id)\
+        .add_columns(response_totals.c.response_count, response_totals.c.admin_responded)
+    
+    # Most recently updated first, seeking past the cursor without a COUNT when one is given
+    if cursor is not None:
+        try:
+            tickets, next_cursor = keyset_paginate(query, SupportTicket.updated_at, SupportTicket.id, cursor, per_page,
+                                                   row_key=lambda row: (row[0].updated_at, row[0].id))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        tickets_page = query.order_by(desc(SupportTicket.updated_at))\
+            .paginate(page=page, per_page=per_page, error_out=False)
+        tickets = tickets_page.items
+        pagination = {'total': tickets_page.total, 'pages': tickets_page.pages, 'current_page': page}
     
     result = []
-    for ticket in tickets.items:
-        # Get user info
-        user = User.query.get(ticket.user_id)
-        
-        # Count responses
-        response_count = TicketResponse.query.filter_by(ticket_id=ticket.id).count()
-        
-        # Check if admin has responded
-        admin_responded = TicketResponse.query\
-            .filter_by(ticket_id=ticket.id, is_from_admin=True)\
-            .first() is not None
-        
+    fetched_at = datetime.utcnow().isoformat()
+    for ticket, response_count, admin_responded in tickets:
+        user = ticket.user
         result.append({
             'id': ticket.id,
             'subject': ticket.subject,
@@ -267,8 +333,8 @@ def admin_get_tickets():
             'status': ticket.status,
             'created_at': ticket.created_at.isoformat(),
             'updated_at': ticket.updated_at.isoformat(),
-            'response_count': response_count,
-            'admin_responded': admin_responded,
+            'response_count': response_count or 0,
+            'admin_responded': bool(admin_responded),
             'user': {
                 'id': user.id,
                 'username': user.username,
@@ -276,50 +342,34 @@ def admin_get_tickets():
             }
         })
     
-    return jsonify({
-        'tickets': result,
-        'total': tickets.total,
-        'pages': tickets.pages,
-        'current_page': page
-    }), 200
+    return jsonify({'tickets': result, 'fetched_at': fetched_at, **pagination}), 200
 
 # Get ticket categories (admin)
 @support_bp.route('/admin/categories', methods=['GET'])
 @admin_required
 def get_categories():
-    # Get distinct categories from tickets
-    categories = db.session.query(SupportTicket.category)\
-        .distinct()\
-        .all()
-    
-    # Extract category names from result tuples
-    category_list = [category[0] for category in categories if category[0]]
-    
-    return jsonify({'categories': category_list}), 200
+    return jsonify({'categories': get_ticket_categories()}), 200
 
 # Get a specific ticket with responses (admin)
 @support_bp.route('/admin/tickets/<int:ticket_id>', methods=['GET'])
 @admin_required
 def admin_get_ticket(ticket_id):
-    # Get the ticket
-    ticket = SupportTicket.query.get(ticket_id)
+    # Get the ticket and its owner in one query
+    ticket = db.session.get(SupportTicket, ticket_id, options=[joinedload(SupportTicket.user)])
     if not ticket:
         return jsonify({'error': 'Ticket not found'}), 404
     
-    # Get user info
-    user = User.query.get(ticket.user_id)
+    user = ticket.user
     
-    # Get ticket responses
-    responses = TicketResponse.query\
+    # Get ticket responses, loading each author in the same query
+    responses = TicketResponse.query.options(joinedload(TicketResponse.user))\
         .filter_by(ticket_id=ticket.id)\
         .order_by(TicketResponse.created_at)\
         .all()
     
     response_list = []
     for resp in responses:
-        # Get user info for response
-        resp_user = User.query.get(resp.user_id)
-        
+        resp_user = resp.user
         response_list.append({
             'id': resp.id,
             'message': resp.message,
@@ -384,6 +434,7 @@ def admin_respond_to_ticket(ticket_id):
     
     db.session.add(response)
     db.session.commit()
+    invalidate_admin_tickets()
     
     return jsonify({
         'message': 'Response added successfully',
@@ -410,6 +461,7 @@ def admin_update_ticket_status(ticket_id):
     ticket.updated_at = datetime.utcnow()
     
     db.session.commit()
+    invalidate_admin_tickets()
     
     return jsonify({
         'message': f'Ticket status updated to {data["status"]}'
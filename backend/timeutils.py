@@ -0,0 +1,12 @@
+from datetime import datetime, timedelta, time
+
+def day_range(day=None):
+    """Return the half-open (start, end) datetimes covering day, today (UTC) by default.
+
+    Filter with column >= start and column < end rather than comparing
+    DATE(column), so the predicate can use a plain index on the column.
+    """
+    if day is None:
+        day = datetime.utcnow().date()
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
@@ -1,33 +1,43 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
-import os
-from datetime import datetime, timedelta
+import base64
+from datetime import datetime, date, timedelta
 
-from models import db, User, Membership, MembershipTier, Referral
+from models import db, User, Membership, MembershipTier, Referral, get_tier_cached
 from user.utils import allowed_file, get_referral_stats
+from user.tasks import finalize_profile_picture
+from app import cache
+from pagination import keyset_paginate
 
 user_bp = Blueprint('user', __name__)
 
+# Cache key for the public membership tiers response
+TIERS_CACHE_KEY = 'membership_tiers_v1'
+
 @user_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    
+    # Load the user with membership and wallet in one query
+    user = db.session.get(User, current_user_id, options=[joinedload(User.membership), joinedload(User.wallet)])
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
     # Get membership info
     membership_info = None
-    if user.membership and user.membership.is_active:
+    tier = get_tier_cached(user.membership.tier_id) if user.membership and user.membership.is_active else None
+    if tier:
         membership_info = {
-            'tier': user.membership.tier.name,
+            'tier': tier.name,
             'start_date': user.membership.start_date.strftime('%Y-%m-%d'),
             'end_date': user.membership.end_date.strftime('%Y-%m-%d'),
             'is_active': user.membership.is_active,
-            'daily_missions': user.membership.tier.daily_missions,
-            'referral_levels': user.membership.tier.referral_levels
+            'daily_missions': tier.daily_missions,
+            'referral_levels': tier.referral_levels
         }
     
     # Get wallet info
@@ -79,8 +89,8 @@ def update_profile():
         if field in data:
             if field == 'date_of_birth' and data[field]:
                 try:
-                    setattr(user, field, datetime.strptime(data[field], '%Y-%m-%d'))
-                except ValueError:
+                    setattr(user, field, date.fromisoformat(data[field]))
+                except (TypeError, ValueError):
                     return jsonify({'error': 'Invalid date format for date_of_birth'}), 400
             else:
                 setattr(user, field, data[field])
@@ -117,25 +127,21 @@ def update_profile_picture():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(f"{user.id}_{int(datetime.utcnow().timestamp())}_{file.filename}")
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'profile_pictures', filename)
         
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        file.save(file_path)
-        
-        # Update user profile picture path
-        user.profile_picture = f"/static/uploads/profile_pictures/{filename}"
-        db.session.commit()
+        # Hand the upload itself to a worker, which resizes it into place and
+        # updates the user; the profile shows the new picture once it is ready
+        image_data = base64.b64encode(file.read()).decode('ascii')
+        finalize_profile_picture.delay(user.id, image_data, filename)
         
         return jsonify({
-            'message': 'Profile picture updated successfully',
-            'profile_picture': user.profile_picture
-        }), 200
+            'message': 'Profile picture is being processed',
+            'status': 'pending'
+        }), 202
     
     return jsonify({'error': 'File type not allowed'}), 400
 
 @user_bp.route('/membership/tiers', methods=['GET'])
+@cache.cached(timeout=300, key_prefix=TIERS_CACHE_KEY)
 def get_membership_tiers():
     tiers = MembershipTier.query.filter_by(is_active=True).all()
     
@@ -197,12 +203,21 @@ def get_referrals():
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
-    # Get direct referrals (level 1)
-    direct_referrals = Referral.query.filter_by(referrer_id=user.id, level=1).all()
+    per_page = request.args.get('per_page', 50, type=int)
+    cursor = request.args.get('cursor')
+    
+    # Get a page of direct referrals (level 1), newest first, loading each referred user and membership in the same query
+    query = Referral.query\
+        .options(joinedload(Referral.referred).joinedload(User.membership))\
+        .filter_by(referrer_id=user.id, level=1)
+    try:
+        direct_referrals, next_cursor = keyset_paginate(query, Referral.created_at, Referral.id, cursor, per_page)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
     
     result = []
     for referral in direct_referrals:
-        referred_user = User.query.get(referral.referred_id)
+        referred_user = referral.referred
         if referred_user:
             result.append({
                 'id': referred_user.id,
@@ -216,6 +231,8 @@ def get_referrals():
     
     return jsonify({
         'referrals': result,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
         'stats': stats,
         'referral_code': user.username  # Using username as referral code
     }), 200
\ No newline at end of file
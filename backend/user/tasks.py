@@ -0,0 +1,68 @@
+import base64
+import io
+import os
+from celery import shared_task
+from flask import current_app
+from PIL import Image, ImageSequence
+from sqlalchemy import update
+
+from models import db, User
+
+# Longest side, in pixels, profile pictures are scaled down to
+PROFILE_PICTURE_MAX_SIZE = 512
+
+def shrink_image(image, path):
+    """Scale image down to PROFILE_PICTURE_MAX_SIZE and save it to path in its own format.
+
+    Every frame of an animated image is scaled, and the frame timings and
+    loop count are kept, so animated GIFs stay animated.
+    """
+    size = (PROFILE_PICTURE_MAX_SIZE, PROFILE_PICTURE_MAX_SIZE)
+    if not getattr(image, 'is_animated', False):
+        image_format = image.format
+        image.thumbnail(size)
+        image.save(path, format=image_format)
+        return
+    
+    frames = []
+    durations = []
+    for frame in ImageSequence.Iterator(image):
+        durations.append(frame.info.get('duration', 100))
+        frame = frame.copy()
+        frame.thumbnail(size)
+        frames.append(frame)
+    
+    frames[0].save(
+        path,
+        format=image.format,
+        save_all=True,
+        append_images=frames[1:],
+        duration=durations,
+        loop=image.info.get('loop', 0),
+        disposal=2
+    )
+
+@shared_task(name='user.tasks.finalize_profile_picture')
+def finalize_profile_picture(user_id, image_data, filename):
+    """Shrink an uploaded profile picture into place and point the user at it.
+
+    image_data is the upload base64-encoded, so the worker does not need to
+    share a disk with the web process that received it.
+    """
+    final_path = os.path.join(current_app.config['PROFILE_PICTURE_DIR'], filename)
+    
+    try:
+        with Image.open(io.BytesIO(base64.b64decode(image_data))) as image:
+            shrink_image(image, final_path)
+    except (OSError, ValueError) as e:
+        current_app.logger.error(f"Error processing profile picture for user {user_id}: {str(e)}")
+        return None
+    
+    profile_picture = f"/static/uploads/profile_pictures/{filename}"
+    db.session.execute(
+        update(User)
+            .where(User.id == user_id)
+            .values(profile_picture=profile_picture)
+    )
+    db.session.commit()
+    return profile_picture
@@ -1,5 +1,6 @@
 from flask import current_app
-from models import db, User, Referral, ReferralCommission, Membership
+from sqlalchemy.orm import joinedload
+from models import db, User, Referral, ReferralCommission, Membership, get_tier_cached
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
@@ -8,14 +9,15 @@ def allowed_file(filename):
 
 def get_referral_stats(user_id):
     """Get referral statistics for a user"""
-    user = User.query.get(user_id)
+    user = db.session.get(User, user_id, options=[joinedload(User.membership)])
     if not user:
         return None
     
     # Get max referral levels based on membership
     max_levels = 0
     if user.membership and user.membership.is_active:
-        max_levels = user.membership.tier.referral_levels
+        tier = get_tier_cached(user.membership.tier_id)
+        max_levels = tier.referral_levels if tier else 0
     
     # Initialize stats
     stats = {
@@ -24,39 +26,49 @@ def get_referral_stats(user_id):
         'levels': {}
     }
     
-    # Get referrals by level
+    if not max_levels:
+        return stats
+    
+    # Referral counts and commission totals for every level in one round trip.
+    # A referral can have several commissions, so count distinct referrals.
+    rows = db.session.query(
+        Referral.level,
+        db.func.count(db.distinct(Referral.id)),
+        db.func.coalesce(db.func.sum(ReferralCommission.amount), 0)
+    ).outerjoin(
+        ReferralCommission, ReferralCommission.referral_id == Referral.id
+    ).filter(
+        Referral.referrer_id == user.id,
+        Referral.level <= max_levels
+    ).group_by(Referral.level).all()
+    by_level = {level: (count, commissions) for level, count, commissions in rows}
+    
+    # Bind the config rates and the levels dict once for the loop
+    rates = current_app.config['REFERRAL_COMMISSION_RATES']
+    levels = stats['levels']
     for level in range(1, max_levels + 1):
-        referrals_count = Referral.query.filter_by(referrer_id=user.id, level=level).count()
-        
-        # Get commissions for this level
-        commissions = db.session.query(db.func.sum(ReferralCommission.amount)).join(
-            Referral, Referral.id == ReferralCommission.referral_id
-        ).filter(
-            Referral.referrer_id == user.id,
-            Referral.level == level
-        ).scalar() or 0
-        
-        stats['levels'][level] = {
+        referrals_count, commissions = by_level.get(level, (0, 0))
+        levels[level] = {
             'count': referrals_count,
             'commissions': commissions,
-            'rate': current_app.config['REFERRAL_COMMISSION_RATES'].get(level, 0)
+            'rate': rates.get(level, 0)
         }
-        
-        stats['total_referrals'] += referrals_count
-        stats['total_commissions'] += commissions
+    
+    stats['total_referrals'] = sum(referrals_count for referrals_count, _ in by_level.values())
+    stats['total_commissions'] = sum(commissions for _, commissions in by_level.values())
     
     return stats
 
 def calculate_referral_commission(membership_tier_id, level):
     """Calculate referral commission for a membership purchase"""
-    tier = MembershipTier.query.get(membership_tier_id)
+    tier = get_tier_cached(membership_tier_id)
     if not tier:
         return 0
     
     # Get commission rate for this level
     rate = current_app.config['REFERRAL_COMMISSION_RATES'].get(level, 0)
     
-    # Calculate commission
-    commission = int(tier.price * rate / 100)
+    # Calculate commission in whole KES, without a float round trip
+    commission = tier.price * rate // 100
     
     return commission
\ No newline at end of file
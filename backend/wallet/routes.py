@@ -1,42 +1,80 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
+import math
+from sqlalchemy import insert
 
-from models import db, User, Wallet, WalletTransaction, Withdrawal
+from models import db, Wallet, WalletTransaction, Withdrawal, InsufficientFunds
+from pagination import keyset_paginate
+from streaming import row_to_dict, stream_json_list
+from app import cache
 
 wallet_bp = Blueprint('wallet', __name__)
 
+# Every transaction insert also bumps wallet.updated_at, so keying on it
+# retires cached wallet data as soon as the wallet changes
+TRANSACTION_COUNT_CACHE_KEY = 'wallet_tx_count_v1:{}:{}'
+TRANSACTION_COUNT_CACHE_TIMEOUT = 60
+RECENT_TRANSACTIONS_CACHE_KEY = 'wallet_recent_tx_v1:{}:{}'
+RECENT_TRANSACTIONS_CACHE_TIMEOUT = 3600
+
+# Rows fetched per round trip while streaming transaction and withdrawal pages
+WALLET_STREAM_BATCH_SIZE = 50
+# Largest page a client may ask for
+WALLET_MAX_PER_PAGE = 100
+
+# Fields a withdrawal request must carry, and the payout methods it may ask for
+WITHDRAWAL_REQUIRED_FIELDS = frozenset({'amount', 'method', 'account_info'})
+WITHDRAWAL_METHODS = frozenset({'mpesa', 'bank', 'paypal'})
+
+def get_user_wallet(user_id):
+    """Get the wallet of user_id straight from wallets, without loading the user"""
+    return Wallet.query.filter_by(user_id=user_id).first()
+
+def wallet_cache_key(template, wallet):
+    """Cache key for data derived from wallet's transactions"""
+    return template.format(wallet.id, wallet.updated_at.timestamp() if wallet.updated_at else 0)
+
+def count_transactions(wallet, query):
+    """Get the number of transactions in a wallet, cached until it next changes"""
+    key = wallet_cache_key(TRANSACTION_COUNT_CACHE_KEY, wallet)
+    total = cache.get(key)
+    if total is None:
+        total = query.count()
+        cache.set(key, total, timeout=TRANSACTION_COUNT_CACHE_TIMEOUT)
+    return total
+
+def get_recent_transactions(wallet):
+    """Get the 10 newest transactions of a wallet, cached until it next changes"""
+    key = wallet_cache_key(RECENT_TRANSACTIONS_CACHE_KEY, wallet)
+    transactions = cache.get(key)
+    if transactions is None:
+        recent_transactions = WalletTransaction.query.filter_by(wallet_id=wallet.id)\
+            .with_entities(WalletTransaction.id, WalletTransaction.amount, WalletTransaction.type,
+                           WalletTransaction.description, WalletTransaction.created_at)\
+            .order_by(WalletTransaction.created_at.desc(), WalletTransaction.id.desc())\
+            .limit(10)\
+            .all()
+        transactions = [row_to_dict(transaction) for transaction in recent_transactions]
+        cache.set(key, transactions, timeout=RECENT_TRANSACTIONS_CACHE_TIMEOUT)
+    return transactions
+
 @wallet_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_wallet():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
+    wallet = get_user_wallet(current_user_id)
     
-    if not user.wallet:
+    if not wallet:
         return jsonify({'error': 'Wallet not found'}), 404
     
-    # Get recent transactions
-    recent_transactions = WalletTransaction.query.filter_by(wallet_id=user.wallet.id)\
-        .order_by(WalletTransaction.created_at.desc()).limit(10).all()
-    
-    transactions = []
-    for transaction in recent_transactions:
-        transactions.append({
-            'id': transaction.id,
-            'amount': transaction.amount,
-            'type': transaction.type,
-            'description': transaction.description,
-            'created_at': transaction.created_at.isoformat()
-        })
+    transactions = get_recent_transactions(wallet)
     
     return jsonify({
         'wallet': {
-            'balance': user.wallet.balance,
-            'total_earned': user.wallet.total_earned,
-            'total_withdrawn': user.wallet.total_withdrawn,
+            'balance': wallet.balance,
+            'total_earned': wallet.total_earned,
+            'total_withdrawn': wallet.total_withdrawn,
             'recent_transactions': transactions
         }
     }), 200
@@ -45,52 +83,54 @@ def get_wallet():
 @jwt_required()
 def get_transactions():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    wallet = get_user_wallet(current_user_id)
     
-    if not user or not user.wallet:
+    if not wallet:
         return jsonify({'error': 'Wallet not found'}), 404
     
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    
-    transactions = WalletTransaction.query.filter_by(wallet_id=user.wallet.id)\
-        .order_by(WalletTransaction.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    result = []
-    for transaction in transactions.items:
-        result.append({
-            'id': transaction.id,
-            'amount': transaction.amount,
-            'type': transaction.type,
-            'description': transaction.description,
-            'reference': transaction.reference,
-            'created_at': transaction.created_at.isoformat()
-        })
-    
-    return jsonify({
-        'transactions': result,
-        'total': transactions.total,
-        'pages': transactions.pages,
-        'current_page': page
-    }), 200
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), WALLET_MAX_PER_PAGE)
+    cursor = request.args.get('cursor')
+    
+    # Read-only listing, so select plain column rows rather than ORM objects
+    query = WalletTransaction.query.filter_by(wallet_id=wallet.id)\
+        .with_entities(WalletTransaction.id, WalletTransaction.amount, WalletTransaction.type,
+                       WalletTransaction.description, WalletTransaction.reference, WalletTransaction.created_at)
+    
+    # Newest first, seeking past the cursor without a COUNT when one is given
+    if cursor is not None:
+        try:
+            transactions, next_cursor = keyset_paginate(query, WalletTransaction.created_at, WalletTransaction.id, cursor, per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        page = max(page, 1)
+        total = count_transactions(wallet, query)
+        pagination = {'total': total, 'pages': math.ceil(total / per_page), 'current_page': page}
+        # Fetch the page in batches while it is streamed out
+        transactions = query.order_by(WalletTransaction.created_at.desc(), WalletTransaction.id.desc())\
+            .limit(per_page)\
+            .offset((page - 1) * per_page)\
+            .yield_per(WALLET_STREAM_BATCH_SIZE)
+    
+    return stream_json_list('transactions', transactions, **pagination), 200
 
 @wallet_bp.route('/withdraw', methods=['POST'])
 @jwt_required()
 def request_withdrawal():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    wallet = get_user_wallet(current_user_id)
     
-    if not user or not user.wallet:
+    if not wallet:
         return jsonify({'error': 'Wallet not found'}), 404
     
     data = request.get_json()
     
     # Validate required fields
-    required_fields = ['amount', 'method', 'account_info']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'{field} is required'}), 400
+    missing = WITHDRAWAL_REQUIRED_FIELDS - data.keys()
+    if missing:
+        return jsonify({'error': f'{min(missing)} is required'}), 400
     
     # Validate amount
     amount = data['amount']
@@ -98,68 +138,77 @@ def request_withdrawal():
         return jsonify({'error': 'Invalid amount'}), 400
     
     # Check if user has sufficient balance
-    if user.wallet.balance < amount:
+    if wallet.balance < amount:
         return jsonify({'error': 'Insufficient balance'}), 400
     
     # Validate withdrawal method
     method = data['method']
-    valid_methods = ['mpesa', 'bank', 'paypal']
-    if method not in valid_methods:
-        return jsonify({'error': f'Invalid method. Must be one of: {valid_methods}'}), 400
-    
-    # Create withdrawal request
-    withdrawal = Withdrawal(
-        user_id=user.id,
-        amount=amount,
-        method=method,
-        account_info=data['account_info'],
-        status='pending'
-    )
-    
-    # Deduct funds from wallet
+    if method not in WITHDRAWAL_METHODS:
+        return jsonify({'error': f"Invalid method. Must be one of: {', '.join(sorted(WITHDRAWAL_METHODS))}"}), 400
+    
+    # Deduct funds and record the withdrawal in one transaction. The balance
+    # is checked and decremented by a single conditional UPDATE, and the
+    # withdrawal id comes back from its INSERT, so nothing is re-read after
+    # the commit.
+    # Payouts are settled by hand through the admin withdrawals endpoint and
+    # no payout client exists to call, so the request is not queued to Celery.
     try:
-        user.wallet.deduct_funds(amount, f'Withdrawal request via {method}')
-        db.session.add(withdrawal)
+        wallet.deduct_funds(amount, f'Withdrawal request via {method}')
+        withdrawal_id = db.session.execute(
+            insert(Withdrawal)
+                .values(
+                    user_id=current_user_id,
+                    amount=amount,
+                    method=method,
+                    account_info=data['account_info'],
+                    status='pending'
+                )
+                .returning(Withdrawal.id)
+        ).scalar_one()
         db.session.commit()
-    except ValueError as e:
+    except InsufficientFunds as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'message': 'Withdrawal request submitted successfully',
-        'withdrawal_id': withdrawal.id,
-        'status': withdrawal.status
+        'withdrawal_id': withdrawal_id,
+        'status': 'pending'
     }), 201
 
 @wallet_bp.route('/withdrawals', methods=['GET'])
 @jwt_required()
 def get_withdrawals():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-    
     page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    
-    withdrawals = Withdrawal.query.filter_by(user_id=user.id)\
-        .order_by(Withdrawal.created_at.desc())\
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    result = []
-    for withdrawal in withdrawals.items:
-        result.append({
-            'id': withdrawal.id,
-            'amount': withdrawal.amount,
-            'method': withdrawal.method,
-            'status': withdrawal.status,
-            'created_at': withdrawal.created_at.isoformat(),
-            'processed_at': withdrawal.processed_at.isoformat() if withdrawal.processed_at else None
-        })
-    
-    return jsonify({
-        'withdrawals': result,
-        'total': withdrawals.total,
-        'pages': withdrawals.pages,
-        'current_page': page
-    }), 200
\ No newline at end of file
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), WALLET_MAX_PER_PAGE)
+    cursor = request.args.get('cursor')
+    status = request.args.get('status')
+    
+    # Read-only listing, so select plain column rows rather than ORM objects
+    query = Withdrawal.query.filter_by(user_id=current_user_id)\
+        .with_entities(Withdrawal.id, Withdrawal.amount, Withdrawal.method, Withdrawal.status,
+                       Withdrawal.created_at, Withdrawal.processed_at)
+    
+    # Filtering on pending hits the partial ix_withdrawal_user_pending index
+    if status:
+        query = query.filter(Withdrawal.status == status)
+    
+    # Newest first, seeking past the cursor without a COUNT when one is given
+    if cursor is not None:
+        try:
+            withdrawals, next_cursor = keyset_paginate(query, Withdrawal.created_at, Withdrawal.id, cursor, per_page)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        pagination = {'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+    else:
+        page = max(page, 1)
+        total = query.count()
+        pagination = {'total': total, 'pages': math.ceil(total / per_page), 'current_page': page}
+        # Fetch the page in batches while it is streamed out
+        withdrawals = query.order_by(Withdrawal.created_at.desc(), Withdrawal.id.desc())\
+            .limit(per_page)\
+            .offset((page - 1) * per_page)\
+            .yield_per(WALLET_STREAM_BATCH_SIZE)
+    
+    return stream_json_list('withdrawals', withdrawals, **pagination), 200
\ No newline at end of file
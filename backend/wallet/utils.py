@@ -1,59 +1,64 @@
+import re
 from datetime import datetime
 import requests
-import json
+import orjson
 from flask import current_app
+from config import Config
+
+# Commission percentage per referral level, indexed by level
+COMMISSION_PERCENTS = (0,) + tuple(Config.REFERRAL_COMMISSION_RATES[level]
+                                   for level in range(1, max(Config.REFERRAL_COMMISSION_RATES) + 1))
+
+# Fields a bank account must fill in
+BANK_ACCOUNT_FIELDS = ('bank_name', 'account_number', 'account_name')
+
+# Validation patterns, compiled once at import
+PAYPAL_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+# Anything that is not an ASCII digit, stripped from phone numbers
+NON_DIGIT_RE = re.compile(r'[^0-9]')
+# Kenyan number as 254XXXXXXXXX, 07XXXXXXXX or 7XXXXXXXX; the matched group
+# holds the nine digits that follow the country code
+MPESA_NUMBER_RE = re.compile(r'^(?:254([0-9]{9})|0?(7[0-9]{8}))$')
 
 def validate_mpesa_number(phone_number):
     """Validate M-Pesa phone number format"""
     # Remove any spaces or special characters
-    phone_number = ''.join(filter(str.isdigit, phone_number))
+    phone_number = NON_DIGIT_RE.sub('', phone_number)
     
-    # Check if it's a valid Kenyan phone number
-    if len(phone_number) == 9 and phone_number.startswith('7'):
-        return '254' + phone_number
-    elif len(phone_number) == 10 and phone_number.startswith('07'):
-        return '254' + phone_number[1:]
-    elif len(phone_number) == 12 and phone_number.startswith('254'):
-        return phone_number
-    else:
+    # Check if it's a valid Kenyan phone number and normalize it to 254XXXXXXXXX
+    match = MPESA_NUMBER_RE.match(phone_number)
+    if not match:
         return None
+    return '254' + (match.group(1) or match.group(2))
 
 def validate_bank_account(account_info):
     """Validate bank account information"""
-    required_fields = ['bank_name', 'account_number', 'account_name']
-    
-    try:
-        account_data = json.loads(account_info) if isinstance(account_info, str) else account_info
-        
-        for field in required_fields:
-            if field not in account_data or not account_data[field]:
-                return False
-        
-        return True
-    except:
+    if isinstance(account_info, dict):
+        account_data = account_info
+    elif isinstance(account_info, (str, bytes)):
+        try:
+            account_data = orjson.loads(account_info)
+        except orjson.JSONDecodeError:
+            return False
+        if not isinstance(account_data, dict):
+            return False
+    else:
         return False
+    
+    return all(account_data.get(field) for field in BANK_ACCOUNT_FIELDS)
 
 def validate_paypal_email(email):
     """Validate PayPal email format"""
-    import re
-    
-    # Basic email validation
-    email_pattern = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
-    return bool(email_pattern.match(email))
+    return PAYPAL_EMAIL_RE.match(email) is not None
 
+# Left unmemoized: one f-string per call is cheaper than a cache lookup keyed
+# on every distinct amount
 def format_currency(amount):
     """Format amount as KES currency"""
     return f"KSh {amount:,}"
 
 def calculate_referral_commission(amount, level):
     """Calculate referral commission based on level"""
-    commission_rates = {
-        1: 0.10,  # 10% for level 1
-        2: 0.05,  # 5% for level 2
-        3: 0.03,  # 3% for level 3
-        4: 0.02,  # 2% for level 4
-        5: 0.01   # 1% for level 5
-    }
-    
-    rate = commission_rates.get(level, 0)
-    return int(amount * rate)  # Return as integer (KES)
\ No newline at end of file
+    if 0 < level < len(COMMISSION_PERCENTS):
+        return amount * COMMISSION_PERCENTS[level] // 100  # Whole KES, no float rounding
+    return 0